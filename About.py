@@ -1,10 +1,18 @@
+import pathlib
+
 import streamlit as st
 
+from src.reload import start_release_watcher
+
+path = pathlib.Path(__file__).resolve().parent
+
 st.set_page_config(
     page_title="About",
     page_icon="❓",
 )
 
+start_release_watcher(path / "data/raw", path / "data/processed/combined_data.csv")
+
 st.markdown(
     """
     ## SNOMED CT Explorer 🔍
@@ -39,6 +47,8 @@ st.markdown(
     * Patients may have multiple codes added at different times throughout the year, so the counts presented do not represent the number of patients. You can't use this data to estimate disease prevalence.
     * Code usage is rounded to the nearest 10. Codes with counts <5 are not shown.
     * Years run between  1 Aug and 31 July.
+    * Usage can also be shown per 1,000 registered patients or per general practice, using the totals for each year in the dataset metadata. The number of practices is not available for every year.
+    * Codes in an uploaded or fetched codelist are checked before they are analysed. Codes which are not valid SNOMED CT concept IDs (wrong length, partition identifier or check digit, e.g. a typo) are listed separately from valid codes with no recorded usage.
     * Data prior to 2019 was predominantly submitted in READ2 or CTV3. These have been mapped forward to corresponding SNOMED CT codes.
 
     ### How does it work?
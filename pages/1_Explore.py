@@ -3,11 +3,14 @@ import pathlib
 import pandas as pd
 import streamlit as st
 
-from src.utils import load_data, display_metric
+from src.explore import load_dashboard
+from src.reload import current_dataset_version, start_release_watcher
+from src.utils import display_metric
 
 path = pathlib.Path(__file__).resolve().parents[1]
 DATA_PATH = path / "data/processed/combined_data.csv"
 METADATA_PATH = path / "data/processed/metadata.csv"
+RAW_DATA_PATH = path / "data/raw"
 
 
 def plot_bar_chart(data, x, y, title, help_text):
@@ -15,34 +18,20 @@ def plot_bar_chart(data, x, y, title, help_text):
     st.bar_chart(data, x=x, y=y)
 
 
-@st.cache_data
-def dashboard(data):
-    data_latest_year = data[data["year_start"] == data["year_start"].max()]
+def dashboard(stats):
     st.title("Explore")
     col = st.columns((3, 4.5, 2), gap="medium")
 
     with col[0]:
         st.subheader("Number of recorded events")
-        total_number_recorded = data["Usage"].sum()
         display_metric(
             "Total number of recorded events",
-            total_number_recorded,
+            stats["total_usage"],
             """Total number of times a SNOMED CT code was recorded in patients
             health records across the entire period""",
         )
-
-        total_events_per_year = (
-            data.resample("A", on="year_start")[["Usage"]].sum().reset_index()
-        )
-        total_events_per_year["Year"] = total_events_per_year[
-            "year_start"
-        ].dt.year.apply(lambda x: f"{x}-{x+1}")
-        total_events_per_year["Usage"] = total_events_per_year["Usage"] / 1_000_000_000
-        total_events_per_year = total_events_per_year.rename(
-            columns={"Usage": "Total Events (Billion)"}
-        )
         plot_bar_chart(
-            total_events_per_year,
+            stats["events_per_year"],
             "Year",
             "Total Events (Billion)",
             "Total Events per Year",
@@ -52,27 +41,14 @@ def dashboard(data):
 
         st.divider()
         st.subheader("Number of unique SNOMED CT codes")
-        unique_codes = data["SNOMED_Concept_ID"].nunique()
         display_metric(
             "Total number of unique codes",
-            unique_codes,
+            stats["unique_codes"],
             """Total number of unique SNOMED CT codes recorded in patients
             health records across the entire period""",
         )
-
-        unique_codes_per_year = (
-            data.resample("A", on="year_start")[["SNOMED_Concept_ID"]]
-            .count()
-            .reset_index()
-        )
-        unique_codes_per_year["Year"] = unique_codes_per_year[
-            "year_start"
-        ].dt.year.apply(lambda x: f"{x}-{x+1}")
-        unique_codes_per_year = unique_codes_per_year.rename(
-            columns={"SNOMED_Concept_ID": "Total Codes"}
-        )
         plot_bar_chart(
-            unique_codes_per_year,
+            stats["codes_per_year"],
             "Year",
             "Total Codes",
             "Number of unique codes per year",
@@ -82,21 +58,14 @@ def dashboard(data):
 
         st.divider()
         st.subheader("Number of active codes")
-        active_codes = data[data["Active_at_End"] == True][
-            "SNOMED_Concept_ID"
-        ].nunique()
         display_metric(
             "Number of codes currently active",
-            active_codes,
+            stats["active_codes"],
             "Number of codes active in the latest available year",
         )
-
-        active_codes_with_records = data[
-            (data["Active_at_End"] == True) & (data["Usage"] > 0)
-        ]["SNOMED_Concept_ID"].nunique()
         display_metric(
             "Number of codes currently active with records",
-            active_codes_with_records,
+            stats["active_codes_with_records"],
             """Number of codes active in the latest year with total
             recorded usage above 0""",
         )
@@ -105,100 +74,31 @@ def dashboard(data):
 
     with col[1]:
         st.subheader("Most commonly recorded codes")
-        usage_total = data_latest_year["Usage"].sum()
-        percentile_90 = usage_total * 0.9
-        percentile_99 = usage_total * 0.99
-
-        codes_sorted_by_usage = data_latest_year.sort_values(
-            by="Usage", ascending=False
-        )
-        cumulative_usage = codes_sorted_by_usage["Usage"].cumsum()
-        codes_needed_90th = (cumulative_usage < percentile_90).sum()
-        codes_needed_99th = (cumulative_usage < percentile_99).sum()
         display_metric(
             "Number of codes accounting for top 90% of total usage",
-            codes_needed_90th,
+            stats["codes_needed_90th"],
             "",
         )
         display_metric(
             "Number of codes accounting for top 99% of total usage",
-            codes_needed_99th,
+            stats["codes_needed_99th"],
             "",
         )
 
-        total_all_time = data["Usage"].sum()
-        top_20_all_time = (
-            data.groupby("SNOMED_Concept_ID")
-            .agg({"Usage": "sum"})
-            .nlargest(20, "Usage")
-        )
-        top_20_all_time["% of Total Usage"] = round(
-            (top_20_all_time["Usage"] / total_all_time) * 100, 2
-        )
-        top_20_all_time_with_descriptions = top_20_all_time.merge(
-            data[["SNOMED_Concept_ID", "Description"]].drop_duplicates(),
-            on="SNOMED_Concept_ID",
-            how="left",
-        )
-        top_20_all_time_with_descriptions.rename(
-            columns={"SNOMED_Concept_ID": "SNOMED CT Code"}, inplace=True
-        )
-
         st.markdown("##### Top 20 codes used over the whole period")
-        st.dataframe(
-            top_20_all_time_with_descriptions.set_index("SNOMED CT Code"), height=250
-        )
-        usage_total_latest_year = data_latest_year["Usage"].sum()
-        top_20_last_year = (
-            data_latest_year.groupby("SNOMED_Concept_ID")
-            .agg({"Usage": "sum"})
-            .nlargest(20, "Usage")
-        )
-        top_20_last_year["% of Total Usage"] = round(
-            (top_20_last_year["Usage"] / usage_total_latest_year) * 100, 2
-        )
-        top_20_last_year_with_descriptions = top_20_last_year.merge(
-            data[["SNOMED_Concept_ID", "Description"]].drop_duplicates(),
-            on="SNOMED_Concept_ID",
-            how="left",
-        )
-        top_20_last_year_with_descriptions.rename(
-            columns={"SNOMED_Concept_ID": "SNOMED CT Code"}, inplace=True
-        )
+        st.dataframe(stats["top_codes_all_time"], height=250)
         st.markdown("##### Top 20 codes used in the latest year")
-        st.dataframe(
-            top_20_last_year_with_descriptions.set_index("SNOMED CT Code"), height=250
-        )
+        st.dataframe(stats["top_codes_latest_year"], height=250)
 
         st.divider()
         st.subheader("New codes")
-        new_codes = data_latest_year[
-            (data_latest_year["Active_at_End"] == 1)
-            & (data_latest_year["Active_at_Start"] == 0)
-        ]
-        num_new_codes = new_codes["SNOMED_Concept_ID"].nunique()
         display_metric(
             "Number of new codes",
-            num_new_codes,
+            stats["new_codes"],
             "Number of new codes which became active in the latest year",
         )
         st.markdown("##### Top 20 new codes")
-        top_20_new_codes = (
-            new_codes.groupby("SNOMED_Concept_ID")
-            .agg({"Usage": "sum"})
-            .nlargest(20, "Usage")
-        )
-        top_20_new_codes_with_descriptions = top_20_new_codes.merge(
-            data[["SNOMED_Concept_ID", "Description"]].drop_duplicates(),
-            on="SNOMED_Concept_ID",
-            how="left",
-        )
-        top_20_new_codes_with_descriptions.rename(
-            columns={"SNOMED_Concept_ID": "SNOMED CT Code"}, inplace=True
-        )
-        st.dataframe(
-            top_20_new_codes_with_descriptions.set_index("SNOMED CT Code"), height=250
-        )
+        st.dataframe(stats["top_new_codes"], height=250)
 
     with col[2]:
         metadata = pd.read_csv(METADATA_PATH, header=0)
@@ -231,9 +131,8 @@ def dashboard(data):
 
 def main():
     st.set_page_config(page_title="Explore", page_icon="🔍", layout="wide")
-    data = load_data(DATA_PATH)
-    data["SNOMED_Concept_ID"] = data["SNOMED_Concept_ID"].astype(str)
-    dashboard(data)
+    start_release_watcher(RAW_DATA_PATH, DATA_PATH)
+    dashboard(load_dashboard(DATA_PATH, current_dataset_version(DATA_PATH)))
 
 
 if __name__ == "__main__":
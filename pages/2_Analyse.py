@@ -1,37 +1,99 @@
+import hashlib
 import pathlib
 
-import numpy as np
 import pandas as pd
 import streamlit as st
 
+from src.catalogue import find_codelists, get_codes_from_catalogue, load_catalogue
+from src.codelists import (
+    load_code_index,
+    lookup_rows,
+    normalise_codes,
+    prepare_codelist,
+    read_codelist,
+)
+from src.query import measures_with_values, query_backend_available, select_code_rows
+from src.reload import current_dataset_version, start_release_watcher
+from src.snapshot import load_prepared_data
 from src.utils import (
     display_metric,
-    get_codes_from_url,
-    load_data,
-    plot_time_series,
     select_columns,
+    select_usage_measure,
     show_download_button,
-    show_plots,
 )
+from src.validation import classify_codes
 
 path = pathlib.Path(__file__).resolve().parents[1]
 DATA_PATH = path / "data/processed/combined_data.csv"
+RAW_DATA_PATH = path / "data/raw"
+CATALOGUE_PATH = path / "data/catalogue"
+
+
+def get_code_rows(codes, version):
+    """
+    Get the rows of the main dataset for the given codes.
+
+    The rows are filtered by the query backend if it is installed, so only
+    the rows for the codes are read and the dataset is never loaded.
+    Otherwise they are looked up in the dataset shared between sessions.
+    Either way, only the rows for the codes are copied.
+
+    Args:
+        codes (array-like): Integer concept IDs.
+        version (str): The version of the main dataset.
+
+    Returns:
+        DataFrame: The rows for the codes, in dataset order.
+    """
+    if query_backend_available():
+        return select_code_rows(DATA_PATH, codes, version)
+    rows = lookup_rows(load_code_index(DATA_PATH, version), codes)
+    return load_prepared_data(DATA_PATH, version).iloc[rows]
+
+
+def show_codelists_containing(code):
+    """
+    List the codelists in the offline catalogue which contain the given code.
+
+    Args:
+        code (int): The concept ID.
+    """
+    catalogue = load_catalogue(CATALOGUE_PATH)
+    if catalogue is None:
+        return
+
+    codelists = find_codelists(catalogue, code)
+
+    st.subheader("Codelists containing this code")
+    if codelists.empty:
+        st.write("This code is not in any codelist in the catalogue.")
+    else:
+        st.dataframe(
+            codelists,
+            hide_index=True,
+            column_config={"URL": st.column_config.LinkColumn("URL")},
+        )
 
 
-def handle_code_input(data):
+def handle_code_input(measure, version):
     st.sidebar.title("Code Input")
     st.sidebar.write("Enter a SNOMED CT code to see the counts for that code.")
 
     code_input = st.sidebar.text_input("Enter a code", key="code_input")
 
     if code_input:
-        filtered_data = data[data["SNOMED_Concept_ID"] == code_input]
+        code = normalise_codes([code_input]).iloc[0]
+        filtered_data = get_code_rows([] if pd.isna(code) else [code], version)
         if not filtered_data.empty:
+            from src.plotting import plot_time_series
+
             code_description = filtered_data["Description"].values[0]
 
             st.title(f"Counts for Code: {code_input}")
 
-            filtered_data["Year"] = pd.to_datetime(filtered_data["year_start"])
+            filtered_data = filtered_data.assign(
+                Year=pd.to_datetime(filtered_data["year_start"])
+            )
 
             formatted_data = filtered_data.copy()
 
@@ -99,7 +161,7 @@ def handle_code_input(data):
 
             formatted_data = formatted_data.set_index("Year")
 
-            st.pyplot(plot_time_series(filtered_data))
+            st.pyplot(plot_time_series(filtered_data, measure))
 
             show_download_button(
                 formatted_data.reset_index().to_csv(index=False).encode("utf-8"),
@@ -112,8 +174,13 @@ def handle_code_input(data):
                 f"The code {code_input} was not found. Please ensure the code entered is a SNOMED CT code."
             )
 
+        if not pd.isna(code):
+            show_codelists_containing(code)
+
 
 def display_code_data(filtered_data, code_input):
+    from src.plotting import plot_time_series
+
     st.title(f"Counts for Code: {code_input}")
     formatted_data = filtered_data[["year_start", "Usage"]]
     formatted_data.columns = ["Year", "Usage"]
@@ -123,7 +190,7 @@ def display_code_data(filtered_data, code_input):
     st.pyplot(plot_time_series(filtered_data))
 
 
-def handle_file_upload(data):
+def handle_file_upload(measure, version):
     st.sidebar.title("Upload a Code List")
     st.sidebar.write('Upload a CSV file with a column named "SNOMED_Concept_ID"')
     uploaded_file = st.sidebar.file_uploader(
@@ -131,7 +198,7 @@ def handle_file_upload(data):
     )
 
     if uploaded_file is not None:
-        code_list = pd.read_csv(uploaded_file)
+        digest, code_list = read_codelist(uploaded_file)
 
         columns = {
             "column": "file_upload_code_column",
@@ -140,33 +207,47 @@ def handle_file_upload(data):
 
         column_names = select_columns(code_list, columns)
 
-        data = data.rename(columns={"SNOMED_Concept_ID": column_names["column_name"]})
-
         if st.sidebar.button("Analyse Code List"):
+            from src.analysis import load_usage_matrix, show_plots
+
+            code_list, invalid_codes = prepare_codelist(
+                digest,
+                code_list,
+                column_names["column_name"],
+                column_names["description_column_name"],
+            )
+
+            if invalid_codes:
+                st.warning(
+                    f"{len(invalid_codes)} values in the selected column could not be "
+                    f"read as SNOMED CT codes: {', '.join(invalid_codes[:20])}"
+                )
+
+            code_index = load_code_index(DATA_PATH, version)
+            codes = code_list[column_names["column_name"]].to_numpy()
+            code_status = classify_codes(codes, code_index["sorted_ids"])
+
+            data_subset = get_code_rows(
+                codes[code_status == "matched"], version
+            ).rename(columns={"SNOMED_Concept_ID": column_names["column_name"]})
 
             code_list[column_names["column_name"]] = code_list[
                 column_names["column_name"]
             ].astype(str)
-            if column_names["description_column_name"]:
-                code_list[column_names["description_column_name"]] = code_list[
-                    column_names["description_column_name"]
-                ].astype(str)
-
-            data_subset = data[
-                data[column_names["column_name"]].isin(
-                    code_list[column_names["column_name"]]
-                )
-            ]
 
             show_plots(
                 code_list,
                 column_names["description_column_name"],
                 data_subset,
                 column_names["column_name"],
+                dataset_version=version,
+                usage_matrix=load_usage_matrix(DATA_PATH, version),
+                measure=measure,
+                code_status=code_status,
             )
 
 
-def handle_url_input(data):
+def handle_url_input(measure, version):
     st.sidebar.title("Fetch Codes from OpenCodelists")
     url_input = st.sidebar.text_input("Enter a URL", key="url_input")
     st.sidebar.write(
@@ -177,7 +258,16 @@ def handle_url_input(data):
     )
 
     if url_input:
-        codes_df = get_codes_from_url(url_input)
+        # use the offline catalogue if it has the codelist, to avoid fetching it
+        catalogue = load_catalogue(CATALOGUE_PATH)
+        codes_df = None
+        if catalogue is not None:
+            codes_df = get_codes_from_catalogue(catalogue, url_input)
+
+        if codes_df is None:
+            from src.opencodelists import get_codes_from_url
+
+            codes_df = get_codes_from_url(url_input)
 
         columns = {"column": "url_code_column", "description": "url_description_column"}
 
@@ -186,37 +276,31 @@ def handle_url_input(data):
         description_column_name = column_names["description_column_name"]
 
         if st.sidebar.button("Analyse Code List from URL"):
-            codes = codes_df[column_name].unique().tolist()
-
-            if codes:
-                code_list = pd.DataFrame(codes, columns=[column_name])
+            if not codes_df.empty:
+                from src.analysis import load_usage_matrix, show_plots
+
+                # the fetched codes are normalised in the same way as uploaded
+                # codelists, so that e.g. codes read as floats still match
+                digest = hashlib.sha256(
+                    codes_df.to_csv(index=False).encode("utf-8")
+                ).hexdigest()
+                code_list, invalid_codes = prepare_codelist(
+                    digest, codes_df, column_name, description_column_name
+                )
 
-                if description_column_name:
-                    code_list = code_list.merge(
-                        codes_df[[column_name, description_column_name]],
-                        on=column_name,
-                        how="left",
+                if invalid_codes:
+                    st.warning(
+                        f"{len(invalid_codes)} values in the selected column could not be "
+                        f"read as SNOMED CT codes: {', '.join(map(str, invalid_codes[:20]))}"
                     )
 
                 code_list = code_list.rename(columns={column_name: "SNOMED_Concept_ID"})
-
-                code_list["SNOMED_Concept_ID"] = code_list["SNOMED_Concept_ID"].astype(
-                    str
+                codes = code_list["SNOMED_Concept_ID"].to_numpy()
+                code_status = classify_codes(
+                    codes, load_code_index(DATA_PATH, version)["sorted_ids"]
                 )
 
-                data["SNOMED_Concept_ID"] = data["SNOMED_Concept_ID"].astype(str)
-
-                data["Usage"] = data["Usage"].replace("*", np.nan)
-                data["Usage"] = data["Usage"].astype(float)
-
-                if description_column_name:
-                    code_list[description_column_name] = code_list[
-                        description_column_name
-                    ].astype(str)
-
-                data_subset = data[
-                    data["SNOMED_Concept_ID"].isin(code_list["SNOMED_Concept_ID"])
-                ]
+                data_subset = get_code_rows(codes[code_status == "matched"], version)
 
                 csv = data_subset.to_csv(index=False).encode("utf-8")
                 st.download_button(
@@ -227,8 +311,19 @@ def handle_url_input(data):
                     key="download_csv_url",
                 )
 
+                code_list["SNOMED_Concept_ID"] = code_list["SNOMED_Concept_ID"].astype(
+                    str
+                )
+
                 show_plots(
-                    code_list, description_column_name, data_subset, "SNOMED_Concept_ID"
+                    code_list,
+                    description_column_name,
+                    data_subset,
+                    "SNOMED_Concept_ID",
+                    dataset_version=version,
+                    usage_matrix=load_usage_matrix(DATA_PATH, version),
+                    measure=measure,
+                    code_status=code_status,
                 )
 
 
@@ -259,12 +354,13 @@ def main():
             """
         )
 
-    data = load_data(DATA_PATH)
-    data["SNOMED_Concept_ID"] = data["SNOMED_Concept_ID"].astype(str)
+    start_release_watcher(RAW_DATA_PATH, DATA_PATH)
+    version = current_dataset_version(DATA_PATH)
+    measure = select_usage_measure(measures_with_values(DATA_PATH, version))
 
-    handle_code_input(data)
-    handle_file_upload(data)
-    handle_url_input(data)
+    handle_code_input(measure, version)
+    handle_file_upload(measure, version)
+    handle_url_input(measure, version)
 
 
 if __name__ == "__main__":
@@ -0,0 +1,76 @@
+import pathlib
+
+import streamlit as st
+
+from src.query import (
+    QUERY_ROW_LIMIT,
+    QUERY_TABLE,
+    QUERY_TIMEOUT_SECONDS,
+    query_backend_available,
+    run_read_only_query,
+)
+from src.reload import current_dataset_version, start_release_watcher
+from src.utils import show_download_button
+
+path = pathlib.Path(__file__).resolve().parents[1]
+DATA_PATH = path / "data/processed/combined_data.csv"
+RAW_DATA_PATH = path / "data/raw"
+
+EXAMPLE_QUERY = f"""SELECT year_start, SUM(Usage) AS Usage
+FROM {QUERY_TABLE}
+GROUP BY year_start
+ORDER BY year_start"""
+
+
+def main():
+    st.set_page_config(
+        page_title="Query",
+        page_icon="🗄️",
+    )
+
+    st.title("Query")
+
+    start_release_watcher(RAW_DATA_PATH, DATA_PATH)
+
+    with st.expander(expanded=True, label="How to use"):
+        st.markdown(
+            f"""
+            Run a read-only SQL query against the data. The data is in the
+            `{QUERY_TABLE}` table, with one row per code and year and the columns
+            `SNOMED_Concept_ID`, `Description`, `Usage`, `Active_at_Start`,
+            `Active_at_End`, `year_start` and the usage rates.
+
+            Only a single `SELECT` statement can be run. Up to {QUERY_ROW_LIMIT:,}
+            rows are returned, and queries are cancelled after
+            {QUERY_TIMEOUT_SECONDS} seconds.
+            """
+        )
+
+    if not query_backend_available():
+        st.info("Queries need DuckDB, which is not installed.")
+        return
+
+    sql = st.text_area("SQL query", value=EXAMPLE_QUERY, height=150, key="sql_query")
+
+    if st.button("Run query"):
+        try:
+            results, truncated = run_read_only_query(
+                DATA_PATH, sql, version=current_dataset_version(DATA_PATH)
+            )
+        except (ValueError, TimeoutError) as error:
+            st.error(str(error))
+            return
+
+        if truncated:
+            st.warning(f"Only the first {QUERY_ROW_LIMIT:,} rows are shown.")
+
+        st.dataframe(results)
+        show_download_button(
+            results.to_csv(index=False).encode("utf-8"),
+            "query_results.csv",
+            "download_csv_query",
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,173 @@
+import numpy as np
+import pandas as pd
+from scipy import sparse
+
+from src.data import USAGE_MEASURES
+
+
+def build_usage_matrix(data):
+    """
+    Build sparse code x year matrices of usage from the main dataset.
+
+    Args:
+        data (DataFrame): The main dataset, with integer 'SNOMED_Concept_ID'
+        values and 'Usage' as floats with suppressed values as NaN.
+
+    Returns:
+        dict: The sorted concept IDs ('codes'), the sorted years ('years'),
+        the value of each measure in USAGE_MEASURES available in the data for
+        each code in each year, NaN where a rate has no denominator
+        ('measures') and whether the usage of each code
+        in each year was suppressed ('suppressed').
+    """
+    ids = data["SNOMED_Concept_ID"].to_numpy(dtype=np.int64)
+    codes, code_index = np.unique(ids, return_inverse=True)
+    years, year_index = np.unique(data["year_start"].to_numpy(), return_inverse=True)
+    shape = (len(codes), len(years))
+
+    suppressed = np.isnan(data["Usage"].to_numpy(dtype=float))
+
+    measures = {}
+    for measure in USAGE_MEASURES:
+        if measure in data.columns:
+            # suppressed usage counts as 0, as in the totals. Rates which are
+            # missing because there is no denominator for the year stay NaN,
+            # so the totals for that year are NaN rather than 0.
+            values = data[measure].to_numpy(dtype=float, copy=True)
+            values[suppressed] = 0
+            measures[measure] = sparse.csr_matrix(
+                (values, (code_index, year_index)), shape=shape
+            )
+
+    suppressed_matrix = sparse.csr_matrix(
+        (
+            np.ones(suppressed.sum()),
+            (code_index[suppressed], year_index[suppressed]),
+        ),
+        shape=shape,
+    )
+
+    return {
+        "codes": codes,
+        "years": years,
+        "measures": measures,
+        "suppressed": suppressed_matrix,
+    }
+
+
+def usage_matrix_to_arrays(usage_matrix):
+    """
+    Flatten the usage matrices to plain arrays, e.g. for saving to disk.
+
+    Args:
+        usage_matrix (dict): The matrices returned by build_usage_matrix.
+
+    Returns:
+        dict: The arrays, keyed by name.
+    """
+    matrices = {"suppressed": usage_matrix["suppressed"]}
+    for measure, matrix in usage_matrix["measures"].items():
+        matrices[f"measure_{measure}"] = matrix
+
+    arrays = {"codes": usage_matrix["codes"], "years": usage_matrix["years"]}
+    for name, matrix in matrices.items():
+        arrays[f"{name}_data"] = matrix.data
+        arrays[f"{name}_indices"] = matrix.indices
+        arrays[f"{name}_indptr"] = matrix.indptr
+    return arrays
+
+
+def usage_matrix_from_arrays(arrays):
+    """
+    Rebuild the usage matrices from the arrays returned by usage_matrix_to_arrays.
+
+    Args:
+        arrays (dict): The arrays, keyed by name.
+
+    Returns:
+        dict: The matrices, as returned by build_usage_matrix.
+    """
+    shape = (len(arrays["codes"]), len(arrays["years"]))
+
+    def matrix(name):
+        return sparse.csr_matrix(
+            (
+                arrays[f"{name}_data"],
+                arrays[f"{name}_indices"],
+                arrays[f"{name}_indptr"],
+            ),
+            shape=shape,
+        )
+
+    return {
+        "codes": arrays["codes"],
+        "years": arrays["years"],
+        "measures": {
+            measure: matrix(f"measure_{measure}")
+            for measure in USAGE_MEASURES
+            if f"measure_{measure}_data" in arrays
+        },
+        "suppressed": matrix("suppressed"),
+    }
+
+
+def build_indicator_matrix(codelists, codes):
+    """
+    Build a sparse codelist x code indicator matrix.
+
+    Args:
+        codelists (dict): Maps each codelist name to its integer concept IDs.
+        codes (ndarray): The sorted concept IDs of the usage matrix.
+
+    Returns:
+        csr_matrix: 1 where the code is in the codelist, 0 otherwise. Codes
+        which are not in the dataset are ignored.
+    """
+    rows = []
+    columns = []
+
+    for row, list_codes in enumerate(codelists.values()):
+        list_codes = np.unique(np.asarray(list_codes, dtype=np.int64))
+        positions = np.searchsorted(codes, list_codes)
+        found = positions < len(codes)
+        found[found] = codes[positions[found]] == list_codes[found]
+
+        columns.append(positions[found])
+        rows.append(np.full(found.sum(), row))
+
+    rows = np.concatenate(rows) if rows else np.array([], dtype=int)
+    columns = np.concatenate(columns) if columns else np.array([], dtype=int)
+
+    return sparse.csr_matrix(
+        (np.ones(len(rows)), (rows, columns)), shape=(len(codelists), len(codes))
+    )
+
+
+def aggregate_codelists(codelists, usage_matrix):
+    """
+    Compute the yearly usage of any number of codelists in a single operation.
+
+    Args:
+        codelists (dict): Maps each codelist name to its integer concept IDs.
+        usage_matrix (dict): The matrices returned by build_usage_matrix.
+
+    Returns:
+        DataFrame: One row per codelist and year, with the total of each
+        measure (e.g. 'Usage') and the number of codes in the codelist with
+        suppressed usage ('Suppressed_Codes') in that year.
+    """
+    indicator = build_indicator_matrix(codelists, usage_matrix["codes"])
+    years = usage_matrix["years"]
+
+    aggregated = pd.DataFrame(
+        {
+            "codelist": np.repeat(list(codelists), len(years)),
+            "year_start": np.tile(years, len(codelists)),
+        }
+    )
+    for measure, matrix in usage_matrix["measures"].items():
+        aggregated[measure] = (indicator @ matrix).toarray().ravel()
+
+    suppressed = (indicator @ usage_matrix["suppressed"]).toarray()
+    aggregated["Suppressed_Codes"] = suppressed.ravel().astype(int)
+    return aggregated
@@ -0,0 +1,316 @@
+import numpy as np
+import pandas as pd
+import streamlit as st
+
+from src.aggregation import (
+    aggregate_codelists,
+    build_usage_matrix,
+    usage_matrix_from_arrays,
+)
+from src.cache import codelist_hash, get_result_cache
+from src.codelists import normalise_codes
+from src.data import USAGE_MEASURES, dataset_version, load_data, versioned_loader
+from src.plotting import plot_time_series
+from src.snapshot import read_snapshot_arrays
+from src.utils import show_download_button
+from src.validation import check_concept_ids, classify_codes, describe_invalid_ids
+
+# The number of codes with the highest usage plotted individually, as each
+# chart takes around 0.1 seconds to draw
+PLOTTED_CODES_LIMIT = 20
+
+
+@versioned_loader
+@st.cache_resource(show_spinner=False)
+def _load_usage_matrix(path, version):
+    arrays = read_snapshot_arrays(path, "usage_matrix", version)
+    if arrays is not None:
+        return usage_matrix_from_arrays(arrays)
+    return build_usage_matrix(load_data(path, version))
+
+
+def load_usage_matrix(path, version=None):
+    """
+    Load the sparse usage matrices for the dataset at the given path.
+
+    The matrices are read from the snapshot if there is one for the version,
+    otherwise they are built from the data.
+
+    Args:
+        path (str): The file path to the CSV data.
+        version (str): The dataset version. Defaults to the current version.
+
+    Returns:
+        dict: The matrices returned by build_usage_matrix.
+    """
+    if version is None:
+        version = dataset_version(path)
+    return _load_usage_matrix(path, version)
+
+
+def compute_codelist_usage(
+    code_list, description_column_name, data_subset, column_name, usage_matrix=None
+):
+    """
+    Compute the usage totals and time series for a code list.
+
+    Args:
+        code_list (DataFrame): DataFrame containing the list of codes.
+        description_column_name (str): The name of the column containing the
+        code descriptions within code_list.
+        data_subset (DataFrame): The rows of the main dataset for the codes.
+        column_name (str): The name of the column containing the codes.
+        usage_matrix (dict): The matrices returned by build_usage_matrix. If
+        given, the time series for the code list is computed from them.
+
+    Returns:
+        dict: The total usage of each code ('code_counts'), the time series
+        for the code list ('time_series'), the time series for each code
+        indexed by code ('code_series'), the codes with usage ordered from
+        highest usage to lowest ('ordered_codes') and the description of each
+        code ('descriptions'). The time series and descriptions are indexed by
+        'SNOMED_Concept_ID', whatever the name of the column of codes.
+    """
+    measures = [measure for measure in USAGE_MEASURES if measure in data_subset.columns]
+    merged_data = data_subset.loc[
+        data_subset[column_name].isin(code_list[column_name]),
+        ["year_start", column_name, "Description"] + measures,
+    ]
+
+    descriptions = merged_data.drop_duplicates(column_name).set_index(column_name)[
+        "Description"
+    ]
+
+    code_counts = merged_data.groupby(column_name)[["Usage"]].sum().reset_index()
+    code_counts["Description"] = code_counts[column_name].map(descriptions)
+    code_counts[column_name] = code_counts[column_name].astype(str)
+    code_counts = code_counts.rename(columns={column_name: "SNOMED CT Code"})
+
+    if description_column_name:
+        code_counts = code_counts[["SNOMED CT Code", "Description", "Usage"]]
+
+    code_counts = code_counts.sort_values("Usage", ascending=False).reset_index(
+        drop=True
+    )
+
+    if usage_matrix is not None:
+        codes = pd.to_numeric(code_list[column_name], errors="coerce").dropna()
+        time_series_data = aggregate_codelists(
+            {"codelist": codes.astype("int64")}, usage_matrix
+        ).drop(columns="codelist")
+    else:
+        time_series_data = (
+            merged_data.groupby("year_start")[measures].sum(min_count=1).reset_index()
+        )
+    time_series_data["year_start"] = pd.to_datetime(
+        time_series_data["year_start"]
+    ).dt.date
+    time_series_data["Year"] = pd.to_datetime(time_series_data["year_start"])
+
+    individual_counts = (
+        merged_data.groupby(["year_start", column_name])[measures]
+        .sum(min_count=1)
+        .reset_index()
+    )
+    individual_counts["year_start"] = pd.to_datetime(
+        individual_counts["year_start"]
+    ).dt.date
+    individual_counts["Year"] = pd.to_datetime(individual_counts["year_start"])
+
+    # get list of codes in individual counts, orderd from highest usage to lowest
+    individual_counts_total = (
+        individual_counts.groupby(column_name)["Usage"]
+        .sum()
+        .sort_values(ascending=False)
+    )
+
+    # remove any codes that have no usage
+    individual_counts_total = individual_counts_total[individual_counts_total > 0]
+
+    return {
+        "code_counts": code_counts,
+        "time_series": time_series_data,
+        "code_series": individual_counts.set_index(column_name)
+        .rename_axis("SNOMED_Concept_ID")
+        .sort_index(),
+        "ordered_codes": individual_counts_total.index.tolist(),
+        "descriptions": descriptions.rename_axis("SNOMED_Concept_ID"),
+    }
+
+
+def show_code_check(code_list, description_column_name, column_name, code_status):
+    """
+    Display the codes in the code list which are invalid or have no usage.
+
+    Args:
+        code_list (DataFrame): DataFrame containing the list of codes.
+        description_column_name (str): The name of the column containing the
+        code descriptions within code_list.
+        column_name (str): The name of the column containing the codes.
+        code_status (ndarray): The status of each code in code_list, as
+        returned by classify_codes.
+    """
+    columns = [column_name]
+    if description_column_name:
+        columns.append(description_column_name)
+    names = {column_name: "SNOMED CT Code", description_column_name: "Description"}
+
+    invalid = code_list.loc[code_status == "invalid", columns].rename(columns=names)
+    if not invalid.empty:
+        codes = normalise_codes(invalid["SNOMED CT Code"]).fillna(0)
+        checks = check_concept_ids(codes.to_numpy(dtype="int64"))
+        invalid["Problem"] = describe_invalid_ids(checks)
+        invalid["SNOMED CT Code"] = invalid["SNOMED CT Code"].astype(str)
+
+        st.title("Invalid Codes")
+        st.error(
+            f"{len(invalid):,} codes from the list are not valid SNOMED CT concept IDs."
+        )
+        st.write(invalid.reset_index(drop=True))
+
+    unused = code_list.loc[code_status == "unused", columns].rename(columns=names)
+    if not unused.empty:
+        unused["SNOMED CT Code"] = unused["SNOMED CT Code"].astype(str)
+
+        st.title("Unused Codes")
+        st.warning(
+            f"{len(unused):,} valid codes from the list have no recorded usage in "
+            "the data."
+        )
+        st.write(unused.reset_index(drop=True))
+
+
+def show_time_series(data, measure):
+    """
+    Plot a time series, or say that the measure isn't available if it has no
+    values, e.g. a rate for years without a denominator.
+
+    Args:
+        data (DataFrame): Data containing 'Year' and the measure.
+        measure (str): The column to plot. One of the keys of USAGE_MEASURES.
+    """
+    if data[measure].isna().all():
+        st.info(f"{USAGE_MEASURES[measure]} is not available for this data.")
+    else:
+        st.pyplot(plot_time_series(data, measure))
+
+
+def show_plots(
+    code_list,
+    description_column_name,
+    data_subset,
+    column_name,
+    dataset_version=None,
+    usage_matrix=None,
+    measure="Usage",
+    code_status=None,
+):
+    """
+    For the given code list and data, displays the following:
+    - Codes from the uploaded list that are invalid or were not found in the data
+    - Total recorded codes
+    - Time series for uploaded code list
+    - Time series for each of the most used codes in the uploaded code list
+
+    Args:
+        code_list (DataFrame): DataFrame containing the list of codes.
+        description_column_name (str): The name of the column containing the 
+        code descriptions within code_list.
+        data (DataFrame): The main dataset to compare against.
+        column_name (str): The name of the column containing the codes.
+        dataset_version (str): The version of the main dataset. If given, the
+        computed results are shared between sessions through the result cache.
+        usage_matrix (dict): The matrices returned by build_usage_matrix. If
+        given, the time series for the code list is computed from them.
+        measure (str): The column to plot. One of the keys of USAGE_MEASURES.
+        code_status (ndarray): The status of each code in code_list, as
+        returned by classify_codes. If not given, it is computed from
+        data_subset.
+    """
+
+    if code_status is None:
+        codes = code_list[column_name].astype("int64").to_numpy()
+        dataset_codes = np.unique(data_subset[column_name].astype("int64"))
+        code_status = classify_codes(codes, dataset_codes)
+
+    show_code_check(code_list, description_column_name, column_name, code_status)
+
+    results = None
+    if dataset_version:
+        # the results don't depend on the names of the columns, so the same
+        # codes share results whichever page or column they came from
+        cache_key = (dataset_version, codelist_hash(code_list[column_name]))
+        results = get_result_cache().get(cache_key)
+
+    if results is None:
+        results = compute_codelist_usage(
+            code_list,
+            None,
+            data_subset,
+            column_name,
+            usage_matrix=usage_matrix,
+        )
+        if dataset_version:
+            get_result_cache().put(cache_key, results)
+
+    code_counts = results["code_counts"]
+    if description_column_name:
+        code_counts = code_counts[["SNOMED CT Code", "Description", "Usage"]]
+
+    st.title("Total recorded codes")
+    st.write(code_counts)
+
+    show_download_button(
+        code_counts.to_csv(index=False).encode("utf-8"),
+        "snomed_code_usage_total.csv",
+        "download_csv_total",
+    )
+
+    time_series_data = results["time_series"]
+    st.title("Time Series for Code List")
+    show_time_series(time_series_data, measure)
+
+    if "Suppressed_Codes" in time_series_data.columns:
+        suppressed_codes = time_series_data["Suppressed_Codes"].sum()
+        if suppressed_codes > 0:
+            st.caption(
+                f"""Usage was suppressed (fewer than 5 records) for
+                {suppressed_codes:,} code-years and is not included in the totals."""
+            )
+
+    csv_time_series = (
+        time_series_data.loc[:, ["Year", measure]].to_csv(index=False).encode("utf-8")
+    )
+    show_download_button(
+        csv_time_series, "snomed_code_usage_time_series.csv", "download_csv_time_series"
+    )
+
+    ordered_codes = results["ordered_codes"]
+    if len(ordered_codes) > PLOTTED_CODES_LIMIT:
+        st.caption(
+            f"""Time series are shown for the {PLOTTED_CODES_LIMIT} codes with the
+            highest usage, out of {len(ordered_codes):,} codes with usage. The time
+            series for all codes can be downloaded below."""
+        )
+        all_code_series = results["code_series"].rename_axis(column_name).reset_index()
+        show_download_button(
+            all_code_series.loc[:, [column_name, "Year", measure]]
+            .to_csv(index=False)
+            .encode("utf-8"),
+            "snomed_code_usage_by_code.csv",
+            "download_csv_by_code",
+        )
+
+    for code in ordered_codes[:PLOTTED_CODES_LIMIT]:
+        st.title(f"Time Series for Code: {code}")
+
+        code_data = results["code_series"].loc[[code]].reset_index()
+        code_description = results["descriptions"][code]
+        st.write(f"Description: {code_description}")
+
+        show_time_series(code_data, measure)
+        show_download_button(
+            code_data.loc[:, ["Year", measure]].to_csv(index=False).encode("utf-8"),
+            f"snomed_code_usage_{code}.csv",
+            f"download_csv_url_input_{code}",
+        )
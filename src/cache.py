@@ -0,0 +1,133 @@
+import hashlib
+import sys
+import threading
+from collections import OrderedDict
+
+import numpy as np
+import pandas as pd
+import streamlit as st
+
+# Limits for the shared codelist result cache
+RESULT_CACHE_MAX_BYTES = 256 * 1024 * 1024
+RESULT_CACHE_MAX_ENTRIES = 256
+
+
+def codelist_hash(codes):
+    """
+    Hash a list of codes, ignoring their order and any duplicates.
+
+    Args:
+        codes (array-like): The codes in the code list.
+
+    Returns:
+        str: The hash of the normalised code list.
+    """
+    unique_codes = np.unique(np.asarray(codes).astype(str))
+    return hashlib.sha256("\n".join(unique_codes).encode("utf-8")).hexdigest()
+
+
+def estimate_size(value):
+    """
+    Estimate the memory used by a cached value in bytes.
+
+    Args:
+        value: A DataFrame, Series, dict, list or other object.
+
+    Returns:
+        int: The estimated size in bytes.
+    """
+    if isinstance(value, pd.DataFrame):
+        return int(value.memory_usage(index=True, deep=True).sum())
+    if isinstance(value, pd.Series):
+        return int(value.memory_usage(index=True, deep=True))
+    if isinstance(value, dict):
+        return sys.getsizeof(value) + sum(estimate_size(v) for v in value.values())
+    if isinstance(value, (list, tuple)):
+        return sys.getsizeof(value) + sum(sys.getsizeof(v) for v in value)
+    return sys.getsizeof(value)
+
+
+class ResultCache:
+    """
+    Thread-safe least recently used cache with an entry and memory limit.
+
+    Keys are tuples whose first element is the dataset version, so that
+    results computed against an older version of the data can be dropped
+    with invalidate when the data is rebuilt. Storing a result never drops
+    results for other versions, as runs which started before a rebuild may
+    still be finishing on the older version.
+    """
+
+    def __init__(
+        self, max_bytes=RESULT_CACHE_MAX_BYTES, max_entries=RESULT_CACHE_MAX_ENTRIES
+    ):
+        self.max_bytes = max_bytes
+        self.max_entries = max_entries
+        self._entries = OrderedDict()
+        self._bytes = 0
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self._entries)
+
+    @property
+    def size_bytes(self):
+        return self._bytes
+
+    def get(self, key):
+        """Return the cached value for key, or None if it isn't cached."""
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            self._entries.move_to_end(key)
+            return entry[0]
+
+    def put(self, key, value):
+        """
+        Store a value, evicting the least recently used entries as needed.
+
+        Values larger than the memory limit are not stored.
+        """
+        size = estimate_size(value)
+        if size > self.max_bytes:
+            return
+
+        with self._lock:
+            if key in self._entries:
+                self._bytes -= self._entries.pop(key)[1]
+
+            self._entries[key] = (value, size)
+            self._bytes += size
+
+            while self._bytes > self.max_bytes or len(self._entries) > self.max_entries:
+                _, (_, evicted_size) = self._entries.popitem(last=False)
+                self._bytes -= evicted_size
+
+    def invalidate(self, version=None):
+        """
+        Drop cached results.
+
+        Args:
+            version (str): If given, only results for this dataset version
+            are dropped. Otherwise the whole cache is cleared.
+        """
+        with self._lock:
+            self._invalidate(
+                lambda cached_key: version is None or cached_key[0] == version
+            )
+
+    def _invalidate(self, predicate):
+        for key in [key for key in self._entries if predicate(key)]:
+            self._bytes -= self._entries.pop(key)[1]
+
+
+@st.cache_resource(show_spinner=False)
+def get_result_cache():
+    """
+    Get the result cache shared by all sessions in this process.
+
+    Returns:
+        ResultCache: The shared cache.
+    """
+    return ResultCache()
@@ -0,0 +1,336 @@
+import argparse
+import json
+import os
+import threading
+from pathlib import Path
+from urllib.parse import urlparse
+
+import numpy as np
+import pandas as pd
+import pyarrow.feather as feather
+import streamlit as st
+
+from src.codelists import build_code_index, lookup_rows, normalise_codes
+from src.validation import check_concept_ids
+
+# Increment when the contents of the catalogue change, so that old catalogues
+# are rebuilt rather than read.
+CATALOGUE_FORMAT_VERSION = 2
+
+# Column names used for the codes and their terms in codelist CSVs, in order
+# of preference
+CODE_COLUMNS = ("code", "snomedcode", "snomed_code", "conceptid", "concept_id", "id")
+TERM_COLUMNS = ("term", "description", "name")
+
+OPENCODELISTS_URL = "https://www.opencodelists.org/codelist/"
+
+# The version of the catalogue last loaded, by catalogue directory
+_loaded_versions = {}
+_loaded_versions_lock = threading.Lock()
+
+
+def find_column(columns, candidates):
+    """
+    Find the first column whose name, ignoring case, is one of the candidates.
+
+    Args:
+        columns (list): The column names.
+        candidates (tuple): Lower case names, in order of preference.
+
+    Returns:
+        str: The matching column name, or None if there is no match.
+    """
+    lower_columns = {str(column).lower(): column for column in columns}
+    for candidate in candidates:
+        if candidate in lower_columns:
+            return lower_columns[candidate]
+    return None
+
+
+def read_codelist_file(file):
+    """
+    Read the codes and terms from a codelist CSV.
+
+    Args:
+        file (Path): The codelist CSV.
+
+    Returns:
+        DataFrame: The codes ('code') and terms ('term') as strings.
+    """
+    codelist = pd.read_csv(file, dtype=str)
+    code_column = find_column(codelist.columns, CODE_COLUMNS) or codelist.columns[0]
+    term_column = find_column(codelist.columns, TERM_COLUMNS)
+
+    return pd.DataFrame(
+        {
+            "code": codelist[code_column].str.strip(),
+            "term": codelist[term_column] if term_column else None,
+        }
+    ).dropna(subset=["code"])
+
+
+def codelist_id_from_url(url):
+    """
+    Get the ID of a codelist, e.g. 'nhsd-primary-care-domain-refsets/
+    cpeptide_cod/20200812', from its OpenCodelists URL.
+
+    Args:
+        url (str): The OpenCodelists URL.
+
+    Returns:
+        str: The codelist ID, or None if the URL isn't a codelist URL.
+    """
+    parts = [part for part in urlparse(url.strip()).path.split("/") if part]
+    if "codelist" not in parts:
+        return None
+
+    parts = parts[parts.index("codelist") + 1 :][:3]
+    if len(parts) < 3:
+        return None
+    return "/".join(parts)
+
+
+def write_catalogue(output, codelists, codes):
+    """
+    Write the catalogue, with a reverse index from concept ID to codelists.
+
+    The manifest is written last, so a partly written catalogue is never read.
+
+    Args:
+        output (Path): The catalogue directory.
+        codelists (list): The ID and source file of each codelist.
+        codes (DataFrame): The codes in all of the codelists, with the
+        position of each code's codelist in codelists ('codelist') and the
+        concept ID of each code ('concept_id'), or 0 if it couldn't be read.
+    """
+    output = Path(output)
+    output.mkdir(parents=True, exist_ok=True)
+
+    manifest_file = output / "manifest.json"
+    manifest_file.unlink(missing_ok=True)
+
+    codes = codes.reset_index(drop=True)
+    codes.to_feather(output / "codes.feather", compression="uncompressed")
+
+    # codes which couldn't be read are kept for get_codes_from_catalogue, but
+    # left out of the reverse index so that they aren't found as code 0
+    concept_ids = codes["concept_id"].to_numpy(dtype=np.int64)
+    rows = np.flatnonzero(concept_ids != 0)
+    index = build_code_index(concept_ids[rows])
+    index["order"] = rows[index["order"]]
+    for key, array in index.items():
+        np.save(output / f"reverse_index.{key}.npy", array)
+
+    manifest = {
+        "format_version": CATALOGUE_FORMAT_VERSION,
+        "codelists": codelists,
+    }
+    temporary_file = output / "manifest.json.tmp"
+    temporary_file.write_text(json.dumps(manifest, indent=2))
+    os.replace(temporary_file, manifest_file)
+
+
+def build_catalogue(source, output):
+    """
+    Import a directory of codelist CSVs into a catalogue.
+
+    Each codelist's ID is its path relative to the source directory, without
+    the .csv suffix. Laying out the directory as {org}/{codelist}/{version}.csv
+    gives codelists the IDs used in their OpenCodelists URLs. Files with no
+    valid SNOMED CT concept IDs, e.g. codelists in other coding systems, are
+    skipped.
+
+    Args:
+        source (str): The directory of codelist CSVs.
+        output (str): The catalogue directory.
+
+    Returns:
+        int: The number of codelists imported.
+    """
+    source = Path(source)
+    codelists = []
+    frames = []
+
+    for file in sorted(source.rglob("*.csv")):
+        codelist_id = file.relative_to(source).with_suffix("").as_posix()
+        try:
+            codes = read_codelist_file(file)
+        except Exception as e:
+            print(f"Error loading file {file}: {e}")
+            continue
+
+        concept_ids = normalise_codes(codes["code"]).fillna(0).astype("int64")
+        if not check_concept_ids(concept_ids.to_numpy())["valid"].any():
+            print(f"No SNOMED CT concept IDs found, skipping: {file}")
+            continue
+
+        frames.append(
+            codes.assign(codelist=len(codelists), concept_id=concept_ids.to_numpy())
+        )
+        codelists.append(
+            {"id": codelist_id, "file": file.relative_to(source).as_posix()}
+        )
+
+    if frames:
+        codes = pd.concat(frames, ignore_index=True)
+    else:
+        codes = pd.DataFrame(columns=["code", "term", "codelist", "concept_id"])
+
+    write_catalogue(
+        output,
+        codelists,
+        codes.astype({"codelist": "int32", "concept_id": "int64"}),
+    )
+    return len(codelists)
+
+
+def catalogue_version(path):
+    """
+    Identify the version of the catalogue at the given path.
+
+    Args:
+        path (str): The catalogue directory.
+
+    Returns:
+        str: The version of the catalogue, or None if there is no catalogue.
+    """
+    try:
+        stat = os.stat(Path(path) / "manifest.json")
+    except OSError:
+        return None
+    return f"{stat.st_mtime_ns}-{stat.st_size}"
+
+
+def read_catalogue(path):
+    """
+    Read the catalogue at the given path.
+
+    Args:
+        path (str): The catalogue directory.
+
+    Returns:
+        dict: The codelists ('codelists'), the position of each codelist by
+        ID ('positions'), the codes sorted by codelist ('codes') and the
+        reverse index from concept ID to rows of codes ('index'), or None if
+        there is no catalogue or it is out of date.
+    """
+    path = Path(path)
+    try:
+        manifest = json.loads((path / "manifest.json").read_text())
+    except (OSError, ValueError):
+        return None
+
+    if manifest.get("format_version") != CATALOGUE_FORMAT_VERSION:
+        return None
+
+    codelists = manifest["codelists"]
+    table = feather.read_table(path / "codes.feather", memory_map=True)
+    return {
+        "codelists": codelists,
+        "positions": {codelist["id"]: i for i, codelist in enumerate(codelists)},
+        "codes": table.to_pandas(),
+        "index": {
+            key: np.load(path / f"reverse_index.{key}.npy", mmap_mode="r")
+            for key in ("order", "sorted_ids")
+        },
+    }
+
+
+@st.cache_resource(show_spinner=False)
+def _load_catalogue(path, version):
+    return read_catalogue(path)
+
+
+def load_catalogue(path):
+    """
+    Load the catalogue at the given path, reloading it when it is rebuilt.
+
+    When a rebuilt catalogue is loaded, the previous one is evicted from the
+    cache, so that only one copy is kept in memory.
+
+    Args:
+        path (str): The catalogue directory.
+
+    Returns:
+        dict: The catalogue returned by read_catalogue, or None if there is no
+        catalogue.
+    """
+    version = catalogue_version(path)
+    if version is None:
+        return None
+
+    with _loaded_versions_lock:
+        previous_version = _loaded_versions.get(str(path))
+        _loaded_versions[str(path)] = version
+    if previous_version not in (None, version):
+        _load_catalogue.clear(path, previous_version)
+
+    return _load_catalogue(path, version)
+
+
+def find_codelists(catalogue, code):
+    """
+    Find the codelists which contain a code, using the reverse index.
+
+    Args:
+        catalogue (dict): The catalogue returned by read_catalogue.
+        code (int): The concept ID.
+
+    Returns:
+        DataFrame: The ID ('Codelist'), OpenCodelists URL ('URL') and the term
+        used for the code ('Term') of each codelist containing the code.
+    """
+    rows = lookup_rows(catalogue["index"], [code])
+    matches = catalogue["codes"].iloc[rows]
+    ids = [catalogue["codelists"][i]["id"] for i in matches["codelist"]]
+
+    return pd.DataFrame(
+        {
+            "Codelist": ids,
+            "URL": [f"{OPENCODELISTS_URL}{codelist_id}/" for codelist_id in ids],
+            "Term": matches["term"].to_numpy(),
+        }
+    )
+
+
+def get_codes_from_catalogue(catalogue, url):
+    """
+    Get the codes of the codelist with the given OpenCodelists URL from the
+    catalogue, without network access.
+
+    Args:
+        catalogue (dict): The catalogue returned by read_catalogue.
+        url (str): The OpenCodelists URL.
+
+    Returns:
+        DataFrame: The codes ('code') and terms ('term') of the codelist, or
+        None if it isn't in the catalogue.
+    """
+    position = catalogue["positions"].get(codelist_id_from_url(url))
+    if position is None:
+        return None
+
+    # the codes are stored sorted by codelist
+    positions = catalogue["codes"]["codelist"].to_numpy()
+    start, end = np.searchsorted(positions, [position, position + 1])
+    codes = catalogue["codes"].iloc[start:end][["code", "term"]]
+
+    if codes["term"].isna().all():
+        codes = codes.drop(columns="term")
+    return codes.reset_index(drop=True)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description="Import a directory of codelist CSVs into the offline catalogue."
+    )
+    parser.add_argument("source", help="The directory of codelist CSVs.")
+    parser.add_argument(
+        "--output",
+        default="data/catalogue",
+        help="The catalogue directory.",
+    )
+    args = parser.parse_args()
+
+    count = build_catalogue(args.source, args.output)
+    print(f"Imported {count} codelists to {args.output}")
@@ -0,0 +1,117 @@
+import argparse
+import subprocess
+import sys
+
+# Modules imported by the pages on every script run
+MODULES = [
+    "src.utils",
+    "src.data",
+    "src.snapshot",
+    "src.codelists",
+    "src.validation",
+    "src.query",
+    "src.catalogue",
+    "src.reload",
+    "src.explore",
+]
+
+# Third-party packages imported by the pages on every script run. They are
+# imported before each module is measured, so the budget only covers the time
+# the module itself adds.
+SHARED_DEPENDENCIES = [
+    "numpy",
+    "pandas",
+    "pyarrow",
+    "pyarrow.csv",
+    "pyarrow.feather",
+    "streamlit",
+]
+
+# Heavy dependencies which must only be imported on first use
+LAZY_MODULES = [
+    "matplotlib",
+    "bs4",
+    "requests",
+    "scipy",
+    "duckdb",
+    "pyarrow.parquet",
+]
+
+# Each module measured 0-30 ms on top of the shared dependencies, so this
+# allows for noise but fails if a module starts importing anything heavy
+IMPORT_TIME_BUDGET_MS = 50
+
+
+def measure_import_time(module):
+    """
+    Import a module in a fresh interpreter using -X importtime, after
+    importing the shared dependencies.
+
+    Args:
+        module (str): The name of the module to import.
+
+    Returns:
+        dict: The cumulative import time in microseconds of every module
+        imported, keyed by module name. The time for the module doesn't
+        include the shared dependencies.
+    """
+    shared = ", ".join(SHARED_DEPENDENCIES)
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", f"import {shared}; import {module}"],
+        capture_output=True,
+        text=True,
+        check=True,
+    )
+
+    import_times = {}
+    for line in result.stderr.splitlines():
+        if not line.startswith("import time:") or "cumulative" in line:
+            continue
+        _, cumulative, name = line.split("|")
+        import_times[name.strip()] = int(cumulative)
+    return import_times
+
+
+def check_import_time(modules=MODULES, budget_ms=IMPORT_TIME_BUDGET_MS):
+    """
+    Check that each module imports within the budget and without importing
+    any of the heavy dependencies in LAZY_MODULES.
+
+    Parameters:
+    modules (list): The names of the modules to check.
+    budget_ms (int): The maximum time in milliseconds each module may add to the
+    import time of the shared dependencies.
+
+    Returns:
+    list: A description of each failed check.
+    """
+    failures = []
+
+    for module in modules:
+        import_times = measure_import_time(module)
+        import_time_ms = import_times.get(module, 0) / 1000
+        print(f"{module}: {import_time_ms:.0f} ms")
+
+        if import_time_ms > budget_ms:
+            failures.append(
+                f"{module} took {import_time_ms:.0f} ms to import (budget {budget_ms} ms)"
+            )
+
+        for lazy_module in LAZY_MODULES:
+            if lazy_module in import_times:
+                failures.append(f"{module} imports {lazy_module} at startup")
+
+    return failures
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description="Fail if the modules used by every page import too slowly."
+    )
+    parser.add_argument("--budget-ms", type=int, default=IMPORT_TIME_BUDGET_MS)
+    args = parser.parse_args()
+
+    failures = check_import_time(budget_ms=args.budget_ms)
+    for failure in failures:
+        print(failure)
+    sys.exit(1 if failures else 0)
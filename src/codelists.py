@@ -0,0 +1,205 @@
+import hashlib
+import io
+from decimal import Decimal, InvalidOperation
+
+import numpy as np
+import pandas as pd
+import streamlit as st
+
+from src.data import dataset_version, load_data, versioned_loader
+from src.snapshot import read_snapshot_arrays
+from src.validation import MAX_CONCEPT_ID
+
+
+def _parse_numeric(value):
+    """
+    Parse a single non-digit code such as '1.23e+16' or '12,345.0' to an int.
+
+    Args:
+        value (str): The stripped code value.
+
+    Returns:
+        int or None: The integer code, or None if the value is not an integer.
+    """
+    try:
+        number = Decimal(value.replace(",", ""))
+    except InvalidOperation:
+        return None
+
+    if not number.is_finite() or number != number.to_integral_value():
+        return None
+
+    number = int(number)
+    if 0 < number < MAX_CONCEPT_ID:
+        return number
+    return None
+
+
+def normalise_codes(values):
+    """
+    Normalise raw code values to integer SNOMED CT concept IDs.
+
+    Surrounding whitespace is removed and float formatted values such as
+    '1.23e+16' or '22298006.0' are converted to integers. Values which can't
+    be converted are returned as missing.
+
+    Args:
+        values (Series): The raw code values.
+
+    Returns:
+        Series: Nullable integer ("Int64") Series aligned with values.
+    """
+    strings = pd.Series(values, dtype="object").astype(str).str.strip()
+    codes = pd.Series(pd.NA, index=strings.index, dtype="Int64")
+
+    # the common case: a plain integer, which can be converted in one pass
+    is_digits = strings.str.fullmatch(r"\d{1,18}")
+    codes[is_digits] = strings[is_digits].astype("int64")
+
+    other = ~is_digits & (strings != "")
+    if other.any():
+        codes[other] = strings[other].map(_parse_numeric).astype("Int64")
+
+    return codes
+
+
+@st.cache_data(show_spinner=False)
+def _read_codelist(digest, _content):
+    return pd.read_csv(io.BytesIO(_content), dtype=str)
+
+
+def read_codelist(uploaded_file):
+    """
+    Read an uploaded codelist CSV, parsing each distinct file only once.
+
+    All columns are read as strings so that long codes are not converted to
+    floats. The parsed codelist is cached by the hash of the file content, so
+    reruns of the page reuse it.
+
+    Args:
+        uploaded_file (UploadedFile): The file returned by st.file_uploader.
+
+    Returns:
+        tuple: The content hash and the codelist DataFrame.
+    """
+    content = uploaded_file.getvalue()
+    digest = hashlib.sha256(content).hexdigest()
+    return digest, _read_codelist(digest, content)
+
+
+@st.cache_data(show_spinner=False)
+def _prepare_codelist(digest, column_name, description_column_name, _code_list):
+    columns = [column_name]
+    if description_column_name:
+        columns.append(description_column_name)
+
+    code_list = _code_list[columns].copy()
+    codes = normalise_codes(code_list[column_name])
+
+    invalid = code_list.loc[codes.isna(), column_name].dropna().unique().tolist()
+
+    code_list[column_name] = codes
+    code_list = (
+        code_list.dropna(subset=[column_name])
+        .astype({column_name: "int64"})
+        .drop_duplicates(subset=[column_name])
+        .sort_values(column_name)
+        .reset_index(drop=True)
+    )
+    if description_column_name:
+        code_list[description_column_name] = code_list[description_column_name].astype(
+            str
+        )
+
+    return code_list, invalid
+
+
+def prepare_codelist(digest, code_list, column_name, description_column_name):
+    """
+    Normalise and deduplicate the selected columns of a parsed codelist.
+
+    Args:
+        digest (str): The content hash returned by read_codelist.
+        code_list (DataFrame): The codelist returned by read_codelist.
+        column_name (str): The name of the column containing the codes.
+        description_column_name (str): The name of the column containing the
+        code descriptions, or None.
+
+    Returns:
+        tuple: The codelist DataFrame with one row per integer code, sorted by
+        code, and a list of the raw values which could not be read as codes.
+    """
+    return _prepare_codelist(digest, column_name, description_column_name, code_list)
+
+
+def build_code_index(ids):
+    """
+    Build a sorted index of the concept IDs in the dataset.
+
+    Args:
+        ids (ndarray): Integer concept ID of each row in the dataset.
+
+    Returns:
+        dict: The row order which sorts the IDs ('order') and the sorted
+        IDs ('sorted_ids').
+    """
+    order = np.argsort(ids, kind="stable")
+    return {"order": order, "sorted_ids": ids[order]}
+
+
+@versioned_loader
+@st.cache_resource(show_spinner=False)
+def _load_code_index(path, version):
+    index = read_snapshot_arrays(path, "code_index", version)
+    if index is not None:
+        return index
+
+    ids = load_data(path, version)["SNOMED_Concept_ID"].to_numpy(dtype=np.int64)
+    return build_code_index(ids)
+
+
+def load_code_index(path, version=None):
+    """
+    Load the concept ID index for the dataset at the given path.
+
+    The index is read from the snapshot if there is one for the version,
+    otherwise it is built from the data.
+
+    Args:
+        path (str): The file path to the CSV data.
+        version (str): The dataset version. Defaults to the current version.
+
+    Returns:
+        dict: The index returned by build_code_index.
+    """
+    if version is None:
+        version = dataset_version(path)
+    return _load_code_index(path, version)
+
+
+def lookup_rows(index, codes):
+    """
+    Find the dataset rows for the given codes using binary search.
+
+    Args:
+        index (dict): The index returned by build_code_index.
+        codes (array-like): Integer concept IDs to look up.
+
+    Returns:
+        ndarray: The positions of the matching rows, in dataset order.
+    """
+    codes = np.asarray(codes, dtype=np.int64)
+    sorted_ids = index["sorted_ids"]
+
+    left = np.searchsorted(sorted_ids, codes, side="left")
+    right = np.searchsorted(sorted_ids, codes, side="right")
+    counts = right - left
+
+    # expand each [left, right) range into the positions it covers
+    total = counts.sum()
+    starts = np.repeat(left, counts)
+    offsets = np.arange(total) - np.repeat(np.cumsum(counts) - counts, counts)
+
+    rows = index["order"][starts + offsets]
+    rows.sort()
+    return rows
@@ -0,0 +1,146 @@
+import os
+
+import numpy as np
+import pandas as pd
+import streamlit as st
+
+# Measures of usage in the processed data, with their labels. The rates are
+# added by src/data_processing.py.
+USAGE_MEASURES = {
+    "Usage": "Usage",
+    "Usage_per_1000_Patients": "Usage per 1,000 patients",
+    "Usage_per_Practice": "Usage per practice",
+}
+
+
+def read_data(path):
+    """
+    Read and preprocess CSV from a given path.
+
+    Args:
+        path (str): The file path to the CSV data.
+
+    Returns:
+        DataFrame: Preprocessed pandas DataFrame.
+    """
+    df = pd.read_csv(path)
+    df["year_start"] = pd.to_datetime(df["year_start"], format="%Y-%m-%d")
+    df["Usage"] = df["Usage"].replace("*", np.nan).astype(float)
+    return df
+
+
+# Cached loaders whose first two arguments are the data path and the dataset
+# version, so that their entries for old versions can be evicted
+VERSIONED_LOADERS = []
+
+
+def versioned_loader(loader):
+    """
+    Register a cached loader taking (path, version), so that its entries are
+    evicted by evict_dataset_version.
+    """
+    VERSIONED_LOADERS.append(loader)
+    return loader
+
+
+def evict_dataset_version(path, version):
+    """
+    Drop the cached data and results for one version of the data file.
+
+    Args:
+        path (str): The file path to the CSV data.
+        version (str): The dataset version.
+    """
+    for loader in VERSIONED_LOADERS:
+        loader.clear(path, version)
+
+
+def check_dataset_version(path, version):
+    """
+    Check that the data file at the given path is still the given version.
+
+    Raises:
+        FileNotFoundError: If the file has been replaced by another version.
+    """
+    if dataset_version(path) != version:
+        raise FileNotFoundError(
+            f"Version {version} of {path} has been replaced and has no snapshot."
+        )
+
+
+def read_data_version(path, version):
+    """
+    Read and preprocess one version of the CSV at the given path.
+
+    Args:
+        path (str): The file path to the CSV data.
+        version (str): The dataset version.
+
+    Returns:
+        DataFrame: Preprocessed pandas DataFrame.
+
+    Raises:
+        FileNotFoundError: If the file is, or while it was being read became,
+        a different version, so that data from another version is never
+        returned for this one.
+    """
+    check_dataset_version(path, version)
+    df = read_data(path)
+    check_dataset_version(path, version)
+    return df
+
+
+@versioned_loader
+@st.cache_data
+def _load_data(path, version):
+    return read_data_version(path, version)
+
+
+def load_data(path, version=None):
+    """
+    Load and preprocess CSV from a given path.
+
+    The data is cached by the version of the file, so it is reloaded when the
+    file is replaced.
+
+    Args:
+        path (str): The file path to the CSV data.
+        version (str): The dataset version. Defaults to the current version.
+
+    Returns:
+        DataFrame: Preprocessed pandas DataFrame.
+    """
+    if version is None:
+        version = dataset_version(path)
+    return _load_data(path, version)
+
+
+def prepare_data(df):
+    """
+    Prepare the preprocessed data for the pages, which look up and display
+    concept IDs as strings.
+
+    Args:
+        df (DataFrame): Preprocessed pandas DataFrame.
+
+    Returns:
+        DataFrame: The data with string 'SNOMED_Concept_ID' values.
+    """
+    return df.assign(SNOMED_Concept_ID=df["SNOMED_Concept_ID"].astype(str))
+
+
+def dataset_version(path):
+    """
+    Identify the version of the data file at the given path.
+
+    The version changes whenever the file is rebuilt, so it can be used in
+    cache keys for results derived from the data.
+
+    Args:
+        path (str): The file path to the CSV data.
+
+    Returns:
+        str: The version of the data file.
+    """
+    stat = os.stat(path)
+    return f"{stat.st_mtime_ns}-{stat.st_size}"
@@ -1,26 +1,84 @@
+import os
 import re
+import numpy as np
 import pandas as pd
 from pathlib import Path
 
+from src.validation import check_concept_ids, describe_invalid_ids
 
-def load_and_combine_data(raw_data_folder, processed_data_folder):
+
+def add_usage_rates(df, metadata_file):
     """
-    Loads all .xlsx and .txt files from the specified raw data folder, combines them into a single DataFrame,
-    and saves the combined data as a CSV file in the processed data folder.
+    Adds usage per 1,000 registered patients and usage per practice to the combined data,
+    using the denominators for each reporting period in the dataset metadata.
+
+    Parameters:
+    df (DataFrame): The combined data, with 'Usage' and 'year_start' columns.
+    metadata_file (Path): The path to the metadata CSV, with 'ReportingPeriod',
+    'RegisteredPatients' and 'Practices' columns.
+
+    Returns:
+    DataFrame: The combined data with 'Usage_per_1000_Patients' and 'Usage_per_Practice' columns.
+    Rates are missing where the usage was suppressed or the denominator is not available.
+    """
+    metadata = pd.read_csv(metadata_file)
+    denominators = metadata.set_index("ReportingPeriod")[
+        ["RegisteredPatients", "Practices"]
+    ]
+
+    # reporting periods are named after the years they span, e.g. 2018-19
+    year = pd.to_datetime(df["year_start"]).dt.year
+    reporting_period = year.astype(str) + "-" + ((year + 1) % 100).map("{:02d}".format)
+
+    usage = pd.to_numeric(df["Usage"].replace("*", np.nan), errors="coerce")
+    patients = reporting_period.map(denominators["RegisteredPatients"])
+    practices = reporting_period.map(denominators["Practices"])
+
+    df["Usage_per_1000_Patients"] = usage / patients * 1000
+    df["Usage_per_Practice"] = usage / practices
+    return df
+
+
+def report_invalid_concept_ids(df):
+    """
+    Prints the number of rows in the combined data whose SNOMED CT concept ID fails
+    the length, partition identifier or check digit checks, with some examples.
+
+    Parameters:
+    df (DataFrame): The combined data, with a 'SNOMED_Concept_ID' column.
+
+    Returns:
+    Series: The problem with each invalid concept ID, indexed by row.
+    """
+    ids = pd.to_numeric(df["SNOMED_Concept_ID"], errors="coerce").fillna(0)
+    checks = check_concept_ids(ids.to_numpy(dtype="int64"))
+
+    invalid = ~checks["valid"]
+    problems = pd.Series(describe_invalid_ids(checks)[invalid], index=df.index[invalid])
+
+    if invalid.any():
+        examples = df.loc[problems.index[:5], "SNOMED_Concept_ID"].tolist()
+        print(
+            f"{invalid.sum()} rows have invalid SNOMED CT concept IDs, e.g. {examples}"
+        )
+    return problems
+
+
+def combine_data(raw_data_folder, processed_data_folder):
+    """
+    Loads all .xlsx and .txt files from the specified raw data folder, combines them into a single DataFrame
+    and adds usage rates using the metadata in the processed data folder.
 
     Parameters:
     raw_data_folder (str): The folder path where .xlsx and .txt raw data files are stored.
-    processed_data_folder (str): The folder path where the processed data file will be saved.
+    processed_data_folder (str): The folder path where the metadata is stored.
 
     Returns:
-    None
+    DataFrame: The combined data.
     """
     raw_data_path = Path(raw_data_folder)
     processed_data_path = Path(processed_data_folder)
 
-    # Ensure that the processed_data_folder exists
-    processed_data_path.mkdir(parents=True, exist_ok=True)
-
     all_files = list(raw_data_path.glob("*.xlsx")) + list(raw_data_path.glob("*.txt"))
 
     df_list = []
@@ -52,11 +110,59 @@ def load_and_combine_data(raw_data_folder, processed_data_folder):
         by=["year_start", "SNOMED_Concept_ID"]
     )
 
+    report_invalid_concept_ids(combined_df)
+
+    metadata_file = processed_data_path / "metadata.csv"
+    if metadata_file.exists():
+        combined_df = add_usage_rates(combined_df, metadata_file)
+    else:
+        print(f"Metadata not found, usage rates not added: {metadata_file}")
+
+    return combined_df
+
+
+def write_combined_data(df, output_file):
+    """
+    Saves the combined data as a CSV file, replacing any previous version in a single step so that
+    the app never reads a partly written file.
+
+    Parameters:
+    df (DataFrame): The combined data.
+    output_file (Path): The path of the CSV file.
+
+    Returns:
+    None
+    """
+    temporary_file = output_file.with_name(f"{output_file.name}.tmp")
+    df.to_csv(temporary_file, index=False)
+    os.replace(temporary_file, output_file)
+
+
+def load_and_combine_data(raw_data_folder, processed_data_folder):
+    """
+    Loads all .xlsx and .txt files from the specified raw data folder, combines them into a single DataFrame,
+    adds usage rates using the metadata in the processed data folder, and saves the combined data as a
+    CSV file in the processed data folder.
+
+    Parameters:
+    raw_data_folder (str): The folder path where .xlsx and .txt raw data files are stored.
+    processed_data_folder (str): The folder path where the processed data file will be saved.
+
+    Returns:
+    None
+    """
+    processed_data_path = Path(processed_data_folder)
+
+    # Ensure that the processed_data_folder exists
+    processed_data_path.mkdir(parents=True, exist_ok=True)
+
+    combined_df = combine_data(raw_data_folder, processed_data_folder)
+
     output_file = processed_data_path / "combined_data.csv"
-    combined_df.to_csv(output_file, index=False)
+    write_combined_data(combined_df, output_file)
     print(f"Combined data saved to {output_file}")
 
 
-# Example usage
+# Example usage, run with python -m src.data_processing
 if __name__ == "__main__":
     load_and_combine_data("data/raw", "data/processed")
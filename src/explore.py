@@ -0,0 +1,125 @@
+import streamlit as st
+
+from src.data import dataset_version, versioned_loader
+from src.snapshot import load_prepared_data
+
+
+def format_reporting_years(year_start):
+    """
+    Label each reporting year by the years it spans, e.g. '2018-2019'.
+
+    Args:
+        year_start (Series): The start date of each reporting year.
+
+    Returns:
+        Series: The label of each reporting year.
+    """
+    return year_start.dt.year.apply(lambda x: f"{x}-{x+1}")
+
+
+def top_codes(data, descriptions, total_usage, n=20):
+    """
+    Find the codes with the highest total usage.
+
+    Args:
+        data (DataFrame): The rows of the dataset to rank codes in.
+        descriptions (DataFrame): The description of each code.
+        total_usage (float): The usage to compute each code's share of. If
+        None, the share isn't computed.
+        n (int): The number of codes to return.
+
+    Returns:
+        DataFrame: The total usage and description of the top codes, indexed
+        by code ('SNOMED CT Code').
+    """
+    top = data.groupby("SNOMED_Concept_ID").agg({"Usage": "sum"}).nlargest(n, "Usage")
+    if total_usage is not None:
+        top["% of Total Usage"] = round((top["Usage"] / total_usage) * 100, 2)
+
+    return (
+        top.merge(descriptions, on="SNOMED_Concept_ID", how="left")
+        .rename(columns={"SNOMED_Concept_ID": "SNOMED CT Code"})
+        .set_index("SNOMED CT Code")
+    )
+
+
+def compute_dashboard(data):
+    """
+    Compute the summary statistics shown on the Explore page.
+
+    Args:
+        data (DataFrame): The prepared dataset.
+
+    Returns:
+        dict: The metrics and tables shown on the page, keyed by name.
+    """
+    data_latest_year = data[data["year_start"] == data["year_start"].max()]
+    descriptions = data[["SNOMED_Concept_ID", "Description"]].drop_duplicates()
+    by_year = data.resample("A", on="year_start")
+
+    events_per_year = by_year[["Usage"]].sum().reset_index()
+    events_per_year["Year"] = format_reporting_years(events_per_year["year_start"])
+    events_per_year["Usage"] = events_per_year["Usage"] / 1_000_000_000
+    events_per_year = events_per_year.rename(
+        columns={"Usage": "Total Events (Billion)"}
+    )
+
+    codes_per_year = by_year[["SNOMED_Concept_ID"]].count().reset_index()
+    codes_per_year["Year"] = format_reporting_years(codes_per_year["year_start"])
+    codes_per_year = codes_per_year.rename(columns={"SNOMED_Concept_ID": "Total Codes"})
+
+    active = data["Active_at_End"] == True
+
+    usage_total_latest_year = data_latest_year["Usage"].sum()
+    cumulative_usage = data_latest_year["Usage"].sort_values(ascending=False).cumsum()
+
+    new_codes = data_latest_year[
+        (data_latest_year["Active_at_End"] == 1)
+        & (data_latest_year["Active_at_Start"] == 0)
+    ]
+
+    total_usage = data["Usage"].sum()
+    return {
+        "total_usage": total_usage,
+        "events_per_year": events_per_year,
+        "unique_codes": data["SNOMED_Concept_ID"].nunique(),
+        "codes_per_year": codes_per_year,
+        "active_codes": data.loc[active, "SNOMED_Concept_ID"].nunique(),
+        "active_codes_with_records": data.loc[
+            active & (data["Usage"] > 0), "SNOMED_Concept_ID"
+        ].nunique(),
+        "codes_needed_90th": (cumulative_usage < usage_total_latest_year * 0.9).sum(),
+        "codes_needed_99th": (cumulative_usage < usage_total_latest_year * 0.99).sum(),
+        "top_codes_all_time": top_codes(data, descriptions, total_usage),
+        "top_codes_latest_year": top_codes(
+            data_latest_year, descriptions, usage_total_latest_year
+        ),
+        "new_codes": new_codes["SNOMED_Concept_ID"].nunique(),
+        "top_new_codes": top_codes(new_codes, descriptions, None),
+    }
+
+
+@versioned_loader
+@st.cache_data(show_spinner=False)
+def _load_dashboard(path, version):
+    return compute_dashboard(load_prepared_data(path, version))
+
+
+def load_dashboard(path, version=None):
+    """
+    Load the summary statistics shown on the Explore page for the dataset at
+    the given path.
+
+    The statistics are cached by dataset version, so the dataset is only
+    loaded and summarised once for each version.
+
+    Args:
+        path (str): The file path to the CSV data.
+        version (str): The dataset version. Defaults to the current version.
+
+    Returns:
+        dict: The statistics returned by compute_dashboard.
+    """
+    if version is None:
+        version = dataset_version(path)
+    return _load_dashboard(path, version)
@@ -0,0 +1,474 @@
+import argparse
+import asyncio
+import itertools
+import json
+import pathlib
+import subprocess
+import sys
+import threading
+import time
+import uuid
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import numpy as np
+import pandas as pd
+from streamlit.proto.BackMsg_pb2 import BackMsg
+from streamlit.proto.Common_pb2 import FileUploaderState, FileURLs, UploadedFileInfo
+from streamlit.proto.ForwardMsg_pb2 import ForwardMsg
+from streamlit.proto.WidgetStates_pb2 import WidgetState
+from tornado.httpclient import AsyncHTTPClient, HTTPClient, HTTPClientError
+from tornado.websocket import websocket_connect
+
+path = pathlib.Path(__file__).resolve().parents[1]
+DATA_PATH = path / "data/processed/combined_data.csv"
+
+FLOWS = ["explore", "code_input", "upload", "url"]
+
+STUB_CODELIST_PATH = "/codelist/load-test/stub-codelist/v1/"
+
+
+def start_opencodelists_stub(codelist_csv):
+    """
+    Serve a single codelist in the same form as OpenCodelists.
+
+    Args:
+        codelist_csv (str): The CSV served by the codelist's 'Download CSV' link.
+
+    Returns:
+        tuple: The URL of the codelist page and the server, which should be shut
+        down with server.shutdown().
+    """
+    page = f"""
+        <dl><dt><h3>Coding system</h3></dt><dd>SNOMED CT</dd></dl>
+        <a href="{STUB_CODELIST_PATH}download.csv">Download CSV</a>
+    """
+
+    class Handler(BaseHTTPRequestHandler):
+        def do_GET(self):
+            if self.path == STUB_CODELIST_PATH:
+                body, content_type = page, "text/html"
+            elif self.path == f"{STUB_CODELIST_PATH}download.csv":
+                body, content_type = codelist_csv, "text/csv"
+            else:
+                self.send_error(404)
+                return
+
+            self.send_response(200)
+            self.send_header("Content-Type", content_type)
+            self.end_headers()
+            self.wfile.write(body.encode("utf-8"))
+
+        def log_message(self, *args):
+            pass
+
+    server = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return f"http://127.0.0.1:{server.server_port}{STUB_CODELIST_PATH}", server
+
+
+def start_app(port):
+    """
+    Start the app in a headless Streamlit server and wait until it is healthy.
+
+    Args:
+        port (int): The port to serve the app on.
+
+    Returns:
+        Popen: The server process.
+    """
+    process = subprocess.Popen(
+        [
+            sys.executable,
+            "-m",
+            "streamlit",
+            "run",
+            "About.py",
+            "--server.headless=true",
+            f"--server.port={port}",
+            "--server.enableXsrfProtection=false",
+            "--browser.gatherUsageStats=false",
+        ],
+        cwd=path,
+        stdout=subprocess.DEVNULL,
+        stderr=subprocess.DEVNULL,
+    )
+
+    client = HTTPClient()
+    deadline = time.time() + 60
+    while time.time() < deadline:
+        try:
+            client.fetch(f"http://127.0.0.1:{port}/_stcore/health")
+            return process
+        except (HTTPClientError, OSError):
+            time.sleep(0.5)
+
+    process.terminate()
+    raise RuntimeError("The Streamlit server did not start within 60 seconds")
+
+
+def resident_memory_mb(pid):
+    """
+    Get the resident memory of a process in MB. Only available on Linux.
+
+    Args:
+        pid (int): The process ID.
+
+    Returns:
+        float: The resident memory, or None if it can't be read.
+    """
+    try:
+        with open(f"/proc/{pid}/status") as status:
+            for line in status:
+                if line.startswith("VmRSS:"):
+                    return int(line.split()[1]) / 1024
+    except OSError:
+        return None
+    return None
+
+
+class AppSession:
+    """
+    A headless browser session, driving the app over Streamlit's websocket
+    protocol.
+    """
+
+    def __init__(self, port):
+        self.port = port
+        self._connection = None
+        self._cached_messages = {}
+
+    async def connect(self):
+        self._connection = await websocket_connect(
+            f"ws://127.0.0.1:{self.port}/_stcore/stream"
+        )
+
+    def close(self):
+        if self._connection is not None:
+            self._connection.close()
+
+    async def _send(self, back_msg):
+        await self._connection.write_message(back_msg.SerializeToString(), binary=True)
+
+    async def _receive(self):
+        payload = await self._connection.read_message()
+        if payload is None:
+            raise ConnectionError("The Streamlit server closed the connection")
+
+        msg = ForwardMsg()
+        msg.ParseFromString(payload)
+
+        # large messages are only sent in full once per session
+        if msg.WhichOneof("type") == "ref_hash":
+            return self._cached_messages[msg.ref_hash]
+        if msg.metadata.cacheable:
+            self._cached_messages[msg.hash] = msg
+        return msg
+
+    async def rerun(self, page_name, widget_states=()):
+        """
+        Run a page of the app with the given widget values.
+
+        Args:
+            page_name (str): The name of the page, e.g. 'Analyse'.
+            widget_states (list): WidgetState messages for the widgets set by
+            the user.
+
+        Returns:
+            list: The elements rendered by the page.
+        """
+        back_msg = BackMsg()
+        back_msg.rerun_script.page_name = page_name
+        back_msg.rerun_script.widget_states.widgets.extend(widget_states)
+        await self._send(back_msg)
+
+        elements = []
+        while True:
+            msg = await self._receive()
+            if msg.WhichOneof("type") == "delta":
+                if msg.delta.WhichOneof("type") == "new_element":
+                    elements.append(msg.delta.new_element)
+            elif msg.WhichOneof("type") == "script_finished":
+                return elements
+
+    async def upload_file(self, name, content):
+        """
+        Upload a file in the same way as st.file_uploader does in the browser.
+
+        Args:
+            name (str): The file name.
+            content (bytes): The file content.
+
+        Returns:
+            UploadedFileInfo: The uploaded file, for the file uploader's state.
+        """
+        back_msg = BackMsg()
+        back_msg.file_urls_request.request_id = uuid.uuid4().hex
+        back_msg.file_urls_request.file_names.append(name)
+        await self._send(back_msg)
+
+        while True:
+            msg = await self._receive()
+            if msg.WhichOneof("type") == "file_urls_response":
+                file_urls = msg.file_urls_response.file_urls[0]
+                break
+
+        boundary = uuid.uuid4().hex
+        body = (
+            f"--{boundary}\r\n"
+            f'Content-Disposition: form-data; name="file"; filename="{name}"\r\n'
+            "Content-Type: text/csv\r\n\r\n"
+        ).encode("utf-8")
+        body += content + f"\r\n--{boundary}--\r\n".encode("utf-8")
+
+        await AsyncHTTPClient().fetch(
+            f"http://127.0.0.1:{self.port}{file_urls.upload_url}",
+            method="PUT",
+            headers={"Content-Type": f"multipart/form-data; boundary={boundary}"},
+            body=body,
+        )
+
+        return UploadedFileInfo(
+            id=1,
+            name=name,
+            size=len(content),
+            file_id=file_urls.file_id,
+            file_urls=FileURLs(
+                file_id=file_urls.file_id,
+                upload_url=file_urls.upload_url,
+                delete_url=file_urls.delete_url,
+            ),
+        )
+
+
+def find_widget(elements, key=None, label=None):
+    """
+    Find a widget among the rendered elements by its key or label.
+
+    Args:
+        elements (list): The elements returned by AppSession.rerun.
+        key (str): The widget key.
+        label (str): The widget label, for widgets without a key.
+
+    Returns:
+        The widget's element message, e.g. a TextInput.
+    """
+    for element in elements:
+        widget = getattr(element, element.WhichOneof("type"))
+        widget_id = getattr(widget, "id", "")
+        if key is not None and widget_id.endswith(f"-{key}"):
+            return widget
+        if label is not None and widget_id and getattr(widget, "label", "") == label:
+            return widget
+    raise LookupError(f"Widget not found: {key or label}")
+
+
+def count_exceptions(elements):
+    return sum(element.WhichOneof("type") == "exception" for element in elements)
+
+
+async def run_flow(session, flow, workload):
+    """
+    Run one representative user flow and time each interaction.
+
+    Args:
+        session (AppSession): The connected session.
+        flow (str): One of FLOWS.
+        workload (dict): The codes, codelist and codelist URL to use.
+
+    Returns:
+        tuple: The latency in seconds of each interaction and the number of
+        exceptions shown by the app.
+
+    Raises:
+        LookupError: If a widget needed by the flow wasn't rendered.
+    """
+    latencies = []
+    exceptions = 0
+
+    async def interact(page_name, widget_states=()):
+        nonlocal exceptions
+        start = time.perf_counter()
+        elements = await session.rerun(page_name, widget_states)
+        latencies.append(time.perf_counter() - start)
+        exceptions += count_exceptions(elements)
+        return elements
+
+    if flow == "explore":
+        await interact("Explore")
+
+    elif flow == "code_input":
+        elements = await interact("Analyse")
+        code_input = find_widget(elements, key="code_input")
+        code = str(next(workload["codes"]))
+        await interact("Analyse", [WidgetState(id=code_input.id, string_value=code)])
+
+    elif flow == "upload":
+        elements = await interact("Analyse")
+        file_uploader = find_widget(elements, key="uploaded_file")
+        uploaded_file = await session.upload_file(
+            "codelist.csv", workload["codelist_csv"].encode("utf-8")
+        )
+        file_state = WidgetState(
+            id=file_uploader.id,
+            file_uploader_state_value=FileUploaderState(
+                max_file_id=1, uploaded_file_info=[uploaded_file]
+            ),
+        )
+        elements = await interact("Analyse", [file_state])
+        button = find_widget(elements, label="Analyse Code List")
+        await interact(
+            "Analyse", [file_state, WidgetState(id=button.id, trigger_value=True)]
+        )
+
+    elif flow == "url":
+        elements = await interact("Analyse")
+        url_input = find_widget(elements, key="url_input")
+        url_state = WidgetState(id=url_input.id, string_value=workload["url"])
+        elements = await interact("Analyse", [url_state])
+        button = find_widget(elements, label="Analyse Code List from URL")
+        await interact(
+            "Analyse", [url_state, WidgetState(id=button.id, trigger_value=True)]
+        )
+
+    else:
+        raise ValueError(f"Unknown flow: {flow}")
+
+    return latencies, exceptions
+
+
+async def run_session(port, session_number, iterations, flows, workload):
+    """
+    Run each flow the given number of times in a new session.
+
+    Returns:
+        tuple: The latency in seconds of each interaction and the number of
+        exceptions shown by the app or flows which could not be completed.
+    """
+    session = AppSession(port)
+    await session.connect()
+
+    latencies = []
+    exceptions = 0
+    # start each session on a different flow, so that the flows overlap
+    flow_order = itertools.islice(
+        itertools.cycle(flows), session_number, session_number + iterations * len(flows)
+    )
+    try:
+        for flow in flow_order:
+            try:
+                flow_latencies, flow_exceptions = await run_flow(
+                    session, flow, workload
+                )
+            except LookupError:
+                # the page didn't render the widget the flow needs
+                exceptions += 1
+                continue
+            latencies.extend(flow_latencies)
+            exceptions += flow_exceptions
+    finally:
+        session.close()
+
+    return latencies, exceptions
+
+
+async def run_level(port, process, sessions, iterations, flows, workload):
+    """
+    Run the given number of concurrent sessions and summarise their latency.
+
+    Returns:
+        dict: The results for this number of sessions.
+    """
+    start = time.perf_counter()
+    results = await asyncio.gather(
+        *[
+            run_session(port, session_number, iterations, flows, workload)
+            for session_number in range(sessions)
+        ]
+    )
+    elapsed = time.perf_counter() - start
+
+    latencies = np.array([latency for result in results for latency in result[0]])
+    return {
+        "sessions": sessions,
+        "interactions": len(latencies),
+        "exceptions": sum(result[1] for result in results),
+        "p50_ms": round(np.percentile(latencies, 50) * 1000, 1),
+        "p95_ms": round(np.percentile(latencies, 95) * 1000, 1),
+        "throughput_per_s": round(len(latencies) / elapsed, 2),
+        "resident_memory_mb": resident_memory_mb(process.pid),
+    }
+
+
+def build_workload(codelist_size, data_path=DATA_PATH):
+    """
+    Pick the codes used by the flows from the processed data.
+
+    Returns:
+        dict: An endless iterator of codes for the code input ('codes'), the
+        CSV of a codelist ('codelist_csv') and the URL of the same codelist on
+        the OpenCodelists stub ('url').
+    """
+    data = pd.read_csv(data_path, usecols=["SNOMED_Concept_ID", "Description"])
+    data = data.drop_duplicates("SNOMED_Concept_ID")
+    codelist = data.sample(min(codelist_size, len(data)), random_state=0)
+    codelist_csv = codelist.rename(
+        columns={"SNOMED_Concept_ID": "code", "Description": "term"}
+    ).to_csv(index=False)
+
+    return {
+        "codes": itertools.cycle(data["SNOMED_Concept_ID"].sample(100, random_state=1)),
+        "codelist_csv": codelist_csv,
+    }
+
+
+def run_load_test(session_counts, iterations, flows, codelist_size, port):
+    """
+    Start the app and measure it under increasing numbers of concurrent sessions.
+
+    Args:
+        session_counts (list): The numbers of concurrent sessions to simulate.
+        iterations (int): How many times each session runs each flow.
+        flows (list): The flows to run, from FLOWS.
+        codelist_size (int): The number of codes in the uploaded and fetched
+        codelists.
+        port (int): The port to serve the app on.
+
+    Returns:
+        list: The results for each number of sessions.
+    """
+    workload = build_workload(codelist_size)
+    workload["url"], stub = start_opencodelists_stub(workload["codelist_csv"])
+    process = start_app(port)
+
+    try:
+        results = []
+        for sessions in session_counts:
+            results.append(
+                asyncio.run(
+                    run_level(port, process, sessions, iterations, flows, workload)
+                )
+            )
+            print(json.dumps(results[-1]))
+        return results
+    finally:
+        process.terminate()
+        process.wait()
+        stub.shutdown()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description="Measure the app's latency, throughput and memory under load."
+    )
+    parser.add_argument("--sessions", type=int, nargs="+", default=[1, 2, 4, 8])
+    parser.add_argument("--iterations", type=int, default=3)
+    parser.add_argument("--flows", nargs="+", choices=FLOWS, default=FLOWS)
+    parser.add_argument("--codelist-size", type=int, default=50)
+    parser.add_argument("--port", type=int, default=8599)
+    args = parser.parse_args()
+
+    results = run_load_test(
+        args.sessions, args.iterations, args.flows, args.codelist_size, args.port
+    )
+    print()
+    print(pd.DataFrame(results).to_string(index=False))
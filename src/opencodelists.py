@@ -0,0 +1,53 @@
+import io
+from urllib.parse import urljoin
+
+import pandas as pd
+import requests
+import streamlit as st
+from bs4 import BeautifulSoup
+
+
+def get_codes_from_url(url):
+    """
+    Fetch codes from an OpenCodelists URL.
+
+    Args:
+        url (str): URL to fetch codes from. Must be in the form 
+        https://www.opencodelists.org/codelist/{org}/{codelist}/{version}
+
+    Returns:
+        DataFrame: DataFrame containing the codes, or an empty DataFrame if an error occurs.
+    """
+    try:
+        response = requests.get(url)
+        soup = BeautifulSoup(response.text, "html.parser")
+        
+        coding_system_dt = soup.find('h3', string='Coding system')
+        if coding_system_dt:
+            coding_system_dd = coding_system_dt.find_parent('dt').find_next_sibling('dd')
+            coding_system = coding_system_dd.text.strip() if coding_system_dd else None
+        else:
+            coding_system = None
+
+        if coding_system != "SNOMED CT":
+            st.error(
+                """The coding system for this codelist is not SNOMED-CT.
+                Please check the URL and try again."""
+            )
+            return pd.DataFrame()
+
+        download_link = soup.find(
+            "a", string=lambda text: "Download CSV" in (text or "")
+        )["href"]
+        
+        download_link = urljoin(url, download_link)
+
+        r = requests.get(download_link)
+        r.raise_for_status()
+
+        return pd.read_csv(io.StringIO(r.content.decode("utf-8")))
+    except Exception:
+        st.error(
+            "Failed to retrieve data from the URL. Please check the URL and try again."
+        )
+        return pd.DataFrame()
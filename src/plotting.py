@@ -0,0 +1,76 @@
+import matplotlib.dates as mdates
+from matplotlib.figure import Figure
+from matplotlib.ticker import FuncFormatter
+
+from src.data import USAGE_MEASURES
+
+
+def custom_date_formatter(x, pos):
+    date = mdates.num2date(x)
+    start_month_year = date.strftime("%Y")
+    end_date = date.replace(year=date.year + 1)
+    end_month_year = end_date.strftime("%Y")
+    date_str = f"{start_month_year}-{end_month_year}"
+    return date_str
+
+
+def plot_time_series(data, measure="Usage"):
+    """
+    Generate a time series plot from the given data.
+
+    Args:
+        data (DataFrame): Data containing 'year_start' and 'Usage' columns.
+        measure (str): The column to plot. One of the keys of USAGE_MEASURES.
+
+    Returns:
+        Matplotlib figure: The generated time series plot.
+    """
+    data_copy = data.copy()
+    data_copy["Usage"] = data_copy[measure]
+
+    # set the scale. If max usage is >10000, convert usage to 1000.
+
+    label = USAGE_MEASURES[measure]
+    ylabels_dict = {
+        "default": label,
+        "thousands": f"{label} (thousands)",
+        "millions": f"{label} (millions)",
+    }
+
+    if data_copy["Usage"].max() > 1000 and data_copy["Usage"].max() < 10000:
+        data_copy["Usage"] = data_copy["Usage"] / 1000
+        ylabel = ylabels_dict["thousands"]
+
+    elif data_copy["Usage"].max() > 10000:
+        data_copy["Usage"] = data_copy["Usage"] / 1000000
+        ylabel = ylabels_dict["millions"]
+    else:
+        ylabel = ylabels_dict["default"]
+
+    # a standalone Figure rather than pyplot's global current figure, which is
+    # shared by every session running in the server
+    fig = Figure(figsize=(10, 5))
+    ax = fig.subplots()
+    bars = ax.bar(
+        data_copy["Year"],
+        data_copy["Usage"],
+        width=365,
+        color="blue",
+        alpha=0.5,
+        edgecolor="black",
+        linewidth=0.5,
+    )
+    ax.xaxis.set_major_locator(mdates.YearLocator())
+    ax.xaxis.set_major_formatter(FuncFormatter(custom_date_formatter))
+    ax.set_xlabel("Date", fontsize=14)
+    ax.set_ylabel(ylabel, fontsize=14)
+    ax.grid(True, which="both", linestyle="--", linewidth=0.5)
+    ax.set_xticks([bar.get_x() + bar.get_width() / 2 for bar in bars])
+    ax.tick_params(axis="x", labelsize=12, labelrotation=45)
+    ax.tick_params(axis="y", labelsize=12)
+    ax.margins(x=0)
+    ax.spines["top"].set_visible(False)
+    ax.spines["right"].set_visible(False)
+    ax.set_ylim(bottom=0)
+    fig.tight_layout()
+    return fig
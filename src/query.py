@@ -0,0 +1,219 @@
+import importlib.util
+import threading
+
+import pyarrow as pa
+import pyarrow.csv as pa_csv
+import pyarrow.dataset as ds
+import streamlit as st
+
+from src.data import (
+    USAGE_MEASURES,
+    check_dataset_version,
+    dataset_version,
+    versioned_loader,
+)
+from src.snapshot import read_manifest, snapshot_dir
+
+# The name of the table holding the processed data in queries
+QUERY_TABLE = "usage"
+
+# Limits for queries entered by users
+QUERY_ROW_LIMIT = 10_000
+QUERY_TIMEOUT_SECONDS = 10
+QUERY_MEMORY_LIMIT = "1GB"
+
+
+def query_backend_available():
+    """
+    Check whether the optional DuckDB query backend is installed.
+
+    Returns:
+        bool: True if queries can be pushed down to DuckDB.
+    """
+    return importlib.util.find_spec("duckdb") is not None
+
+
+@versioned_loader
+@st.cache_resource(show_spinner=False)
+def _open_dataset(path, version):
+    if read_manifest(path, version) is not None:
+        return ds.dataset(snapshot_dir(path, version) / "data.parquet")
+
+    # a dataset over the CSV file would read whichever version replaces it,
+    # so the CSV is read into memory while it is still this version
+    check_dataset_version(path, version)
+    table = pa_csv.read_csv(
+        path,
+        convert_options=pa_csv.ConvertOptions(
+            null_values=["*", ""], strings_can_be_null=True
+        ),
+    )
+    check_dataset_version(path, version)
+    return ds.dataset(table)
+
+
+def open_dataset(path, version=None):
+    """
+    Open the processed data as a dataset which can be scanned by DuckDB.
+
+    The Parquet copy in the snapshot is used if there is one for the version,
+    and nothing is read until the dataset is queried, when queries only read
+    the columns and rows they need. Otherwise the CSV is read into memory.
+
+    Args:
+        path (str): The file path to the CSV data.
+        version (str): The dataset version. Defaults to the current version.
+
+    Returns:
+        Dataset: The pyarrow dataset.
+    """
+    if version is None:
+        version = dataset_version(path)
+    return _open_dataset(path, version)
+
+
+@versioned_loader
+@st.cache_resource(show_spinner=False)
+def _measures_with_values(path, version):
+    dataset = open_dataset(path, version)
+    measures = [
+        measure for measure in USAGE_MEASURES if measure in dataset.schema.names
+    ]
+    table = dataset.to_table(columns=measures)
+    return [
+        measure
+        for measure in measures
+        if table.column(measure).null_count < table.num_rows
+    ]
+
+
+def measures_with_values(path, version=None):
+    """
+    Find the usage measures which have at least one value in the processed
+    data, e.g. to hide usage rates which aren't available for any year.
+
+    Args:
+        path (str): The file path to the CSV data.
+        version (str): The dataset version. Defaults to the current version.
+
+    Returns:
+        list: The keys of USAGE_MEASURES which are in the data and aren't
+        entirely missing.
+    """
+    if version is None:
+        version = dataset_version(path)
+    return _measures_with_values(path, version)
+
+
+def connect(path, version=None):
+    """
+    Open a DuckDB connection with the processed data as the 'usage' table.
+
+    The connection can't read or write any other files. A new connection is
+    needed for each query, as tables registered on a connection can't be used
+    from other threads.
+
+    Args:
+        path (str): The file path to the CSV data.
+        version (str): The dataset version. Defaults to the current version.
+
+    Returns:
+        DuckDBPyConnection: The connection, which should be closed after use.
+    """
+    import duckdb
+
+    connection = duckdb.connect()
+    connection.register(QUERY_TABLE, open_dataset(path, version))
+    connection.execute(f"SET memory_limit = '{QUERY_MEMORY_LIMIT}'")
+    connection.execute("SET enable_external_access = false")
+    # stop queries from changing the settings above
+    connection.execute("SET lock_configuration = true")
+    return connection
+
+
+def _prepare_rows(rows):
+    # give the rows the same types as load_prepared_data
+    types = {"SNOMED_Concept_ID": str, "year_start": "datetime64[ns]"}
+    for measure in USAGE_MEASURES:
+        if measure in rows.columns:
+            types[measure] = float
+    return rows.astype(types)
+
+
+def select_code_rows(path, codes, version=None):
+    """
+    Select the rows of the processed data for the given codes in DuckDB.
+
+    Args:
+        path (str): The file path to the CSV data.
+        codes (array-like): Integer concept IDs.
+        version (str): The dataset version. Defaults to the current version.
+
+    Returns:
+        DataFrame: The rows for the codes, sorted by year and code, with the
+        same columns and types as load_prepared_data.
+    """
+    connection = connect(path, version)
+    try:
+        connection.register("codes", pa.table({"code": pa.array(codes, pa.int64())}))
+        rows = connection.execute(
+            f"""
+            SELECT * FROM {QUERY_TABLE}
+            SEMI JOIN codes ON SNOMED_Concept_ID = code
+            ORDER BY year_start, SNOMED_Concept_ID
+            """
+        ).df()
+    finally:
+        connection.close()
+    return _prepare_rows(rows)
+
+
+def run_read_only_query(
+    path, sql, row_limit=QUERY_ROW_LIMIT, timeout=QUERY_TIMEOUT_SECONDS, version=None
+):
+    """
+    Run a single SELECT statement entered by a user against the processed data.
+
+    Args:
+        path (str): The file path to the CSV data.
+        sql (str): The query.
+        row_limit (int): The maximum number of rows to return.
+        timeout (float): The number of seconds after which the query is
+        cancelled.
+        version (str): The dataset version. Defaults to the current version.
+
+    Returns:
+        tuple: The results DataFrame, and whether the results were truncated
+        to row_limit rows.
+
+    Raises:
+        ValueError: If the SQL isn't a single SELECT statement, or the query
+        fails.
+        TimeoutError: If the query takes longer than timeout seconds.
+    """
+    import duckdb
+
+    try:
+        statements = duckdb.extract_statements(sql)
+    except duckdb.Error as error:
+        raise ValueError(str(error)) from error
+
+    if len(statements) != 1 or statements[0].type != duckdb.StatementType.SELECT:
+        raise ValueError("Only a single SELECT statement can be run.")
+
+    connection = connect(path, version)
+    timer = threading.Timer(timeout, connection.interrupt)
+    timer.start()
+    try:
+        results = connection.sql(sql).limit(row_limit + 1).df()
+    except duckdb.InterruptException as error:
+        raise TimeoutError(
+            f"The query was cancelled after {timeout} seconds."
+        ) from error
+    except duckdb.Error as error:
+        raise ValueError(str(error)) from error
+    finally:
+        timer.cancel()
+        connection.close()
+
+    return results.head(row_limit), len(results) > row_limit
@@ -0,0 +1,229 @@
+import argparse
+import fcntl
+import os
+import shutil
+import tempfile
+import threading
+from contextlib import contextmanager
+from pathlib import Path
+
+from src.cache import get_result_cache
+from src.data import dataset_version, evict_dataset_version
+from src.data_processing import combine_data
+from src.snapshot import SNAPSHOTS_KEPT, build_snapshot, prune_snapshots
+
+# Raw release files, as read by combine_data
+RELEASE_PATTERNS = ("*.xlsx", "*.txt")
+
+# Seconds between checks of the raw data folder for new releases
+RELEASE_POLL_SECONDS = 60
+
+# Set to 0 to stop the app watching the raw data folder, e.g. when several
+# app processes share the data folder and a separate process watches it
+WATCH_RELEASES_VARIABLE = "WATCH_RELEASES"
+
+_watcher = None
+_watcher_lock = threading.Lock()
+
+# The dataset versions seen by page runs, oldest first, by data file path
+_seen_versions = {}
+_seen_versions_lock = threading.Lock()
+
+
+def list_release_files(raw_data_folder):
+    """
+    List the raw release files with their modification time and size.
+
+    Args:
+        raw_data_folder (str): The folder of raw release files.
+
+    Returns:
+        dict: The modification time and size of each file, keyed by name.
+    """
+    files = {}
+    for pattern in RELEASE_PATTERNS:
+        for file in Path(raw_data_folder).glob(pattern):
+            stat = file.stat()
+            files[file.name] = (stat.st_mtime_ns, stat.st_size)
+    return files
+
+
+@contextmanager
+def publishing_lock(data_path):
+    """
+    Hold a lock on publishing the processed data at the given path, waiting
+    for any other process which is publishing it to finish.
+
+    Args:
+        data_path (Path): The file path to the processed CSV data.
+    """
+    with open(data_path.with_name(f"{data_path.name}.lock"), "w") as lock_file:
+        fcntl.flock(lock_file, fcntl.LOCK_EX)
+        try:
+            yield
+        finally:
+            fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+
+def publish_release(raw_data_folder, data_path):
+    """
+    Rebuild the processed data from the raw data folder and swap it in.
+
+    The new data is written next to the current file and its snapshot is
+    built before the current file is replaced, so the first run of a page on
+    the new version doesn't have to parse the CSV. The snapshot of the
+    previous version is kept for runs which are still using it.
+
+    Publishing holds a lock file next to the data, so that processes sharing
+    the data folder publish one at a time.
+
+    Args:
+        raw_data_folder (str): The folder of raw release files.
+        data_path (str): The file path to the processed CSV data.
+
+    Returns:
+        str: The version of the new dataset.
+    """
+    data_path = Path(data_path)
+    data_path.parent.mkdir(parents=True, exist_ok=True)
+
+    with publishing_lock(data_path):
+        combined_df = combine_data(raw_data_folder, data_path.parent)
+
+        file_descriptor, temporary_file = tempfile.mkstemp(
+            dir=data_path.parent, prefix=f"{data_path.name}.", suffix=".tmp"
+        )
+        os.close(file_descriptor)
+        try:
+            combined_df.to_csv(temporary_file, index=False)
+            if data_path.exists():
+                shutil.copymode(data_path, temporary_file)
+            build_snapshot(data_path, source=temporary_file)
+
+            # renaming keeps the modification time and size, so the version
+            # of the replaced file matches the snapshot
+            os.replace(temporary_file, data_path)
+        finally:
+            Path(temporary_file).unlink(missing_ok=True)
+
+        prune_snapshots(data_path)
+        return dataset_version(data_path)
+
+
+class ReleaseWatcher(threading.Thread):
+    """
+    Background thread which publishes a new version of the processed data
+    when release files are added to or changed in the raw data folder.
+
+    Files must be unchanged for one interval before they are read, so that
+    files which are still being copied aren't published.
+    """
+
+    def __init__(self, raw_data_folder, data_path, interval=RELEASE_POLL_SECONDS):
+        super().__init__(name="release-watcher", daemon=True)
+        self.raw_data_folder = raw_data_folder
+        self.data_path = data_path
+        self.interval = interval
+        self._stopped = threading.Event()
+
+    def run(self):
+        published = list_release_files(self.raw_data_folder)
+        previous = published
+
+        while not self._stopped.wait(self.interval):
+            current = list_release_files(self.raw_data_folder)
+            if current != published and current == previous:
+                try:
+                    version = publish_release(self.raw_data_folder, self.data_path)
+                    print(f"Published dataset version {version}")
+                except Exception as e:
+                    print(f"Error publishing new release: {e}")
+                # a failed release is retried when the files change again
+                published = current
+            previous = current
+
+    def stop(self):
+        self._stopped.set()
+
+
+def start_release_watcher(raw_data_folder, data_path):
+    """
+    Start watching the raw data folder for new releases, if this process
+    isn't already watching it and watching hasn't been turned off by setting
+    the WATCH_RELEASES environment variable to 0.
+
+    Args:
+        raw_data_folder (str): The folder of raw release files.
+        data_path (str): The file path to the processed CSV data.
+
+    Returns:
+        ReleaseWatcher: The watcher thread, or None if watching is turned off.
+    """
+    if os.environ.get(WATCH_RELEASES_VARIABLE, "1").strip().lower() in (
+        "0",
+        "false",
+        "no",
+    ):
+        return None
+
+    global _watcher
+    with _watcher_lock:
+        if _watcher is None or not _watcher.is_alive():
+            _watcher = ReleaseWatcher(raw_data_folder, data_path)
+            _watcher.start()
+        return _watcher
+
+
+def current_dataset_version(path):
+    """
+    Get the dataset version for a run of a page.
+
+    Pages get the version once at the start of each run and pass it to the
+    loaders, so a run which started before a new version was published
+    finishes on the old version and the next run uses the new one. The first
+    time a new version is seen, cached data and results are evicted for the
+    versions before the previous one, which has its snapshot kept for runs
+    which are still using it.
+
+    Args:
+        path (str): The file path to the CSV data.
+
+    Returns:
+        str: The dataset version.
+    """
+    version = dataset_version(path)
+    with _seen_versions_lock:
+        versions = _seen_versions.setdefault(str(path), [])
+        if version in versions:
+            return version
+        versions.append(version)
+        superseded = versions[:-SNAPSHOTS_KEPT]
+        del versions[:-SNAPSHOTS_KEPT]
+
+    for old_version in superseded:
+        evict_dataset_version(path, old_version)
+        get_result_cache().invalidate(old_version)
+    return version
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description="Rebuild the processed data and its snapshot from the raw data."
+    )
+    parser.add_argument("--raw", default="data/raw", help="The raw data folder.")
+    parser.add_argument(
+        "--path",
+        default="data/processed/combined_data.csv",
+        help="The file path to the processed CSV data.",
+    )
+    parser.add_argument(
+        "--watch",
+        action="store_true",
+        help="Keep running and publish each new release added to the raw data folder.",
+    )
+    args = parser.parse_args()
+
+    if args.watch:
+        ReleaseWatcher(args.raw, args.path).run()
+    else:
+        print(f"Published dataset version {publish_release(args.raw, args.path)}")
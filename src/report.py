@@ -0,0 +1,315 @@
+import argparse
+import base64
+import html
+import io
+import multiprocessing
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+
+import pandas as pd
+
+from src.data import USAGE_MEASURES
+
+# The number of codes with the highest usage to plot for each codelist
+REPORT_TOP_CODES = 10
+
+REPORT_STYLE = """
+body { font-family: sans-serif; margin: 2em auto; max-width: 60em; }
+table { border-collapse: collapse; }
+th, td { border: 1px solid #ccc; padding: 0.25em 0.5em; text-align: left; }
+img { max-width: 100%; }
+"""
+
+
+def read_codelists(source):
+    """
+    Read a directory of codelist CSVs for a report.
+
+    Each codelist's ID is its path relative to the source directory, without
+    the .csv suffix, as in build_catalogue.
+
+    Args:
+        source (str): The directory of codelist CSVs.
+
+    Returns:
+        dict: The codes ('code') and terms ('term') of each codelist, keyed by
+        ID.
+    """
+    from src.catalogue import read_codelist_file
+
+    source = Path(source)
+    codelists = {}
+    for file in sorted(source.rglob("*.csv")):
+        try:
+            codelists[file.relative_to(source).with_suffix("").as_posix()] = (
+                read_codelist_file(file)
+            )
+        except Exception as e:
+            print(f"Error loading file {file}: {e}")
+    return codelists
+
+
+def compute_report(codes, data, code_index, usage_matrix):
+    """
+    Compute the tables and time series reported for a codelist.
+
+    Args:
+        codes (DataFrame): The codes ('code') and terms ('term') of the
+        codelist, as returned by read_codelist_file.
+        data (DataFrame): The prepared dataset.
+        code_index (dict): The index returned by build_code_index.
+        usage_matrix (dict): The matrices returned by build_usage_matrix.
+
+    Returns:
+        dict: The results returned by compute_codelist_usage, with the
+        number of codes in the codelist which are invalid ('invalid') or have
+        no recorded usage ('unused'), or None if the codelist has no valid
+        SNOMED CT concept IDs, e.g. because it uses another coding system.
+    """
+    from src.analysis import compute_codelist_usage
+    from src.codelists import lookup_rows, normalise_codes
+    from src.validation import classify_codes
+
+    concept_ids = normalise_codes(codes["code"])
+    unparsed = codes["code"][concept_ids.isna()].nunique()
+
+    parsed = (
+        pd.DataFrame({"concept_id": concept_ids, "term": codes["term"]})
+        .dropna(subset=["concept_id"])
+        .drop_duplicates("concept_id")
+    )
+    ids = parsed["concept_id"].to_numpy(dtype="int64")
+    code_status = classify_codes(ids, code_index["sorted_ids"])
+    if (code_status == "invalid").all():
+        return None
+
+    code_list = pd.DataFrame(
+        {"SNOMED_Concept_ID": ids.astype(str), "term": parsed["term"].to_numpy()}
+    )
+    data_subset = data.iloc[lookup_rows(code_index, ids[code_status == "matched"])]
+
+    results = compute_codelist_usage(
+        code_list,
+        "term",
+        data_subset,
+        "SNOMED_Concept_ID",
+        usage_matrix=usage_matrix,
+    )
+    results["invalid"] = int(unparsed + (code_status == "invalid").sum())
+    results["unused"] = int((code_status == "unused").sum())
+    return results
+
+
+def figure_to_html(figure):
+    """
+    Embed a figure in HTML as a PNG image.
+
+    Args:
+        figure (Figure): The Matplotlib figure.
+
+    Returns:
+        str: The HTML image element.
+    """
+    buffer = io.BytesIO()
+    figure.savefig(buffer, format="png", dpi=80)
+    image = base64.b64encode(buffer.getvalue()).decode("ascii")
+    return f'<img src="data:image/png;base64,{image}">'
+
+
+def time_series_html(data, measure):
+    """
+    Plot a time series as an HTML image, or say that the measure isn't
+    available if it has no values, as show_time_series does on the page.
+
+    Args:
+        data (DataFrame): Data containing 'Year' and the measure.
+        measure (str): The column to plot. One of the keys of USAGE_MEASURES.
+
+    Returns:
+        str: The HTML for the time series.
+    """
+    from src.plotting import plot_time_series
+
+    if data[measure].isna().all():
+        return f"<p>{html.escape(USAGE_MEASURES[measure])} is not available.</p>"
+    return figure_to_html(plot_time_series(data, measure))
+
+
+def render_report(codelist_id, results, measure="Usage", top_codes=REPORT_TOP_CODES):
+    """
+    Render the report for a codelist as a standalone HTML page.
+
+    Args:
+        codelist_id (str): The ID of the codelist.
+        results (dict): The results returned by compute_report.
+        measure (str): The column to plot. One of the keys of USAGE_MEASURES.
+        top_codes (int): The number of codes with the highest usage to plot.
+
+    Returns:
+        str: The HTML page.
+    """
+    title = html.escape(codelist_id)
+    sections = [
+        f"<h1>{title}</h1>",
+        f"<p>{results['invalid']:,} invalid codes and {results['unused']:,} codes "
+        "with no recorded usage are not included.</p>",
+        "<h2>Total recorded codes</h2>",
+        results["code_counts"].to_html(index=False),
+        "<h2>Time series for code list</h2>",
+        time_series_html(results["time_series"], measure),
+    ]
+
+    for code in results["ordered_codes"][:top_codes]:
+        code_data = results["code_series"].loc[[code]].reset_index()
+        sections += [
+            f"<h2>Time series for code: {html.escape(str(code))}</h2>",
+            f"<p>Description: {html.escape(str(results['descriptions'][code]))}</p>",
+            time_series_html(code_data, measure),
+        ]
+
+    return (
+        f"<!DOCTYPE html><html><head><meta charset='utf-8'><title>{title}</title>"
+        f"<style>{REPORT_STYLE}</style></head><body>"
+        + "\n".join(sections)
+        + "</body></html>"
+    )
+
+
+def _write_report(job):
+    codelist_id, results, output, measure, top_codes = job
+    file = Path(output) / f"{codelist_id}.html"
+    file.parent.mkdir(parents=True, exist_ok=True)
+    file.write_text(render_report(codelist_id, results, measure, top_codes))
+    return file
+
+
+def write_index(output, codelist_ids, measure):
+    """
+    Write the index page linking to the report for each codelist.
+
+    Args:
+        output (Path): The report directory.
+        codelist_ids (list): The IDs of the codelists in the report.
+        measure (str): The measure plotted in the report.
+    """
+    links = "\n".join(
+        f'<li><a href="{html.escape(codelist_id)}.html">'
+        f"{html.escape(codelist_id)}</a></li>"
+        for codelist_id in codelist_ids
+    )
+    (Path(output) / "index.html").write_text(
+        f"<!DOCTYPE html><html><head><meta charset='utf-8'><title>Report</title>"
+        f"<style>{REPORT_STYLE}</style></head><body>"
+        f"<h1>Codelist usage report</h1>"
+        f"<p>Usage is shown as {html.escape(USAGE_MEASURES[measure].lower())}.</p>"
+        f"<ul>{links}</ul></body></html>"
+    )
+
+
+def build_report(
+    codelists,
+    data_path,
+    output,
+    measure="Usage",
+    top_codes=REPORT_TOP_CODES,
+    workers=None,
+):
+    """
+    Build a static HTML report of the usage of each codelist.
+
+    The results for all codelists are computed in this process, where the
+    data is loaded once. Rendering the charts takes most of the time, and
+    Matplotlib isn't thread safe, so the pages are rendered in a pool of
+    worker processes.
+
+    Args:
+        codelists (dict): The codes and terms of each codelist, keyed by ID,
+        as returned by read_codelists.
+        data_path (str): The file path to the processed CSV data.
+        output (str): The report directory.
+        measure (str): The column to plot. One of the keys of USAGE_MEASURES.
+        top_codes (int): The number of codes with the highest usage to plot
+        for each codelist.
+        workers (int): The number of worker processes. Defaults to the
+        number of CPUs.
+
+    Returns:
+        list: The report file for each codelist. Codelists with no valid
+        SNOMED CT concept IDs are skipped.
+    """
+    from src.analysis import load_usage_matrix
+    from src.codelists import load_code_index
+    from src.data import dataset_version
+    from src.snapshot import load_prepared_data
+
+    version = dataset_version(data_path)
+    data = load_prepared_data(data_path, version)
+    code_index = load_code_index(data_path, version)
+    usage_matrix = load_usage_matrix(data_path, version)
+
+    jobs = []
+    for codelist_id, codes in codelists.items():
+        results = compute_report(codes, data, code_index, usage_matrix)
+        if results is None:
+            print(f"No SNOMED CT concept IDs found, skipping: {codelist_id}")
+            continue
+        jobs.append((codelist_id, results, output, measure, top_codes))
+
+    Path(output).mkdir(parents=True, exist_ok=True)
+    # spawn rather than fork, so workers don't inherit the loaded data or
+    # Streamlit's threads
+    with ProcessPoolExecutor(
+        max_workers=workers, mp_context=multiprocessing.get_context("spawn")
+    ) as executor:
+        files = list(executor.map(_write_report, jobs))
+
+    write_index(output, [job[0] for job in jobs], measure)
+    return files
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description="Build a static HTML report of the usage of a directory of codelists."
+    )
+    parser.add_argument("source", help="The directory of codelist CSVs.")
+    parser.add_argument("--output", default="reports", help="The report directory.")
+    parser.add_argument(
+        "--path",
+        default="data/processed/combined_data.csv",
+        help="The file path to the processed CSV data.",
+    )
+    parser.add_argument(
+        "--measure",
+        default="Usage",
+        choices=list(USAGE_MEASURES),
+        help="The usage measure to plot.",
+    )
+    parser.add_argument(
+        "--top",
+        type=int,
+        default=REPORT_TOP_CODES,
+        help="The number of codes with the highest usage to plot for each codelist.",
+    )
+    parser.add_argument(
+        "--workers",
+        type=int,
+        default=os.cpu_count(),
+        help="The number of worker processes.",
+    )
+    args = parser.parse_args()
+
+    start = time.perf_counter()
+    files = build_report(
+        read_codelists(args.source),
+        args.path,
+        args.output,
+        measure=args.measure,
+        top_codes=args.top,
+        workers=args.workers,
+    )
+    print(
+        f"Wrote reports for {len(files)} codelists to {args.output} "
+        f"in {time.perf_counter() - start:.1f} seconds"
+    )
@@ -0,0 +1,290 @@
+import argparse
+import json
+import os
+import shutil
+from pathlib import Path
+
+import numpy as np
+import pyarrow as pa
+import pyarrow.feather as feather
+import streamlit as st
+
+from src.data import (
+    dataset_version,
+    prepare_data,
+    read_data,
+    read_data_version,
+    versioned_loader,
+)
+
+# Increment when the contents of the snapshot change, so that old snapshots
+# are rebuilt rather than read.
+SNAPSHOT_FORMAT_VERSION = 4
+
+# The number of snapshots to keep when a new version is written, so that
+# sessions still using the previous version can finish
+SNAPSHOTS_KEPT = 2
+
+# Rows per row group in the Parquet copy of the data. The data is sorted by
+# year and code, so small row groups let queries skip rows by either.
+PARQUET_ROW_GROUP_SIZE = 16384
+
+
+def snapshot_root(path):
+    """
+    Get the directory holding the snapshots for the data file at the given path.
+
+    Args:
+        path (str): The file path to the CSV data.
+
+    Returns:
+        Path: The directory, with a subdirectory for each dataset version.
+    """
+    path = Path(path)
+    return path.parent / f"{path.stem}_snapshot"
+
+
+def snapshot_dir(path, version=None):
+    """
+    Get the directory holding the snapshot of one version of the data file at
+    the given path.
+
+    Each version has its own directory, so a new version can be written while
+    sessions are still reading the old one.
+
+    Args:
+        path (str): The file path to the CSV data.
+        version (str): The dataset version. Defaults to the current version.
+
+    Returns:
+        Path: The snapshot directory.
+    """
+    if version is None:
+        version = dataset_version(path)
+    return snapshot_root(path) / version
+
+
+def read_manifest(path, version=None):
+    """
+    Read the manifest of the snapshot for the data file at the given path.
+
+    Args:
+        path (str): The file path to the CSV data.
+        version (str): The dataset version. Defaults to the current version.
+
+    Returns:
+        dict: The manifest, or None if there is no snapshot of this version.
+    """
+    try:
+        manifest_file = snapshot_dir(path, version) / "manifest.json"
+        manifest = json.loads(manifest_file.read_text())
+    except (OSError, ValueError):
+        return None
+
+    if manifest.get("format_version") != SNAPSHOT_FORMAT_VERSION:
+        return None
+    return manifest
+
+
+def read_snapshot_data(path, version=None):
+    """
+    Read the prepared dataset from the snapshot.
+
+    Args:
+        path (str): The file path to the CSV data.
+        version (str): The dataset version. Defaults to the current version.
+
+    Returns:
+        DataFrame: The dataset as returned by prepare_data, or None if there
+        is no snapshot of this version.
+    """
+    if read_manifest(path, version) is None:
+        return None
+    table = feather.read_table(
+        snapshot_dir(path, version) / "data.feather", memory_map=True
+    )
+    return table.to_pandas()
+
+
+def read_snapshot_arrays(path, name, version=None):
+    """
+    Memory map a group of derived arrays from the snapshot.
+
+    Args:
+        path (str): The file path to the CSV data.
+        name (str): The name of the group of arrays, e.g. 'code_index'.
+        version (str): The dataset version. Defaults to the current version.
+
+    Returns:
+        dict: The arrays keyed by name, or None if there is no snapshot of
+        this version containing them.
+    """
+    manifest = read_manifest(path, version)
+    if manifest is None or name not in manifest["arrays"]:
+        return None
+
+    directory = snapshot_dir(path, version)
+    return {
+        key: np.load(directory / f"{name}.{key}.npy", mmap_mode="r")
+        for key in manifest["arrays"][name]
+    }
+
+
+def write_snapshot(path, data, arrays, version=None):
+    """
+    Write a snapshot of the prepared dataset and arrays derived from it.
+
+    The dataset is written to Feather, to be memory mapped by the pages, and
+    to Parquet, to be queried by src/query.py.
+
+    The manifest is written last, so a partly written snapshot is never read.
+
+    Args:
+        path (str): The file path to the CSV data.
+        data (DataFrame): The dataset as returned by prepare_data.
+        arrays (dict): Groups of derived arrays, keyed by group name then by
+        array name.
+        version (str): The dataset version. Defaults to the current version.
+    """
+    # imported here as it takes around 70 ms and is only needed when writing
+    import pyarrow.parquet as pq
+
+    if version is None:
+        version = dataset_version(path)
+    directory = snapshot_dir(path, version)
+    directory.mkdir(parents=True, exist_ok=True)
+
+    manifest_file = directory / "manifest.json"
+    manifest_file.unlink(missing_ok=True)
+
+    # uncompressed, so that the file can be memory mapped when it is read
+    data.reset_index(drop=True).to_feather(
+        directory / "data.feather", compression="uncompressed"
+    )
+    # a columnar copy with integer concept IDs for the query backend
+    pq.write_table(
+        pa.Table.from_pandas(
+            data.astype({"SNOMED_Concept_ID": "int64"}), preserve_index=False
+        ),
+        directory / "data.parquet",
+        row_group_size=PARQUET_ROW_GROUP_SIZE,
+    )
+    for name, group in arrays.items():
+        for key, array in group.items():
+            np.save(directory / f"{name}.{key}.npy", np.asarray(array))
+
+    manifest = {
+        "format_version": SNAPSHOT_FORMAT_VERSION,
+        "dataset_version": version,
+        "arrays": {name: list(group) for name, group in arrays.items()},
+    }
+    temporary_file = directory / "manifest.json.tmp"
+    temporary_file.write_text(json.dumps(manifest, indent=2))
+    os.replace(temporary_file, manifest_file)
+
+
+@versioned_loader
+@st.cache_resource(show_spinner=False)
+def _load_prepared_data(path, version):
+    data = read_snapshot_data(path, version)
+    if data is None:
+        data = prepare_data(read_data_version(path, version))
+    return data
+
+
+def load_prepared_data(path, version=None):
+    """
+    Load the dataset prepared for the pages, with string concept IDs.
+
+    The dataset is read from the snapshot if there is one for the version,
+    otherwise it is loaded and prepared from the CSV. A single copy is shared
+    between sessions rather than copied for each run, so it must not be
+    modified; select the rows needed and work on those instead.
+
+    Args:
+        path (str): The file path to the CSV data.
+        version (str): The dataset version. Defaults to the current version.
+
+    Returns:
+        DataFrame: The prepared dataset.
+    """
+    if version is None:
+        version = dataset_version(path)
+    return _load_prepared_data(path, version)
+
+
+def build_snapshot(path, source=None):
+    """
+    Prepare the dataset at the given path and write its snapshot.
+
+    Args:
+        path (str): The file path to the CSV data.
+        source (str): The file to read the data from, if it isn't at path yet,
+        e.g. a new version which will replace it. The snapshot is written for
+        the version of this file.
+    """
+    # imported here as src.codelists imports this module, and scipy is only
+    # needed when building
+    from src.aggregation import build_usage_matrix, usage_matrix_to_arrays
+    from src.codelists import build_code_index
+
+    if source is None:
+        source = path
+
+    data = read_data(source)
+    ids = data["SNOMED_Concept_ID"].to_numpy(dtype=np.int64)
+
+    write_snapshot(
+        path,
+        prepare_data(data),
+        {
+            "code_index": build_code_index(ids),
+            "usage_matrix": usage_matrix_to_arrays(build_usage_matrix(data)),
+        },
+        version=dataset_version(source),
+    )
+
+
+def prune_snapshots(path, keep=SNAPSHOTS_KEPT):
+    """
+    Remove all but the most recently written snapshots, and any files left
+    by snapshots written before there was a directory for each version.
+
+    Snapshots which are still memory mapped by a session stay readable until
+    they are closed.
+
+    Args:
+        path (str): The file path to the CSV data.
+        keep (int): The number of snapshots to keep.
+    """
+    root = snapshot_root(path)
+    if not root.exists():
+        return
+
+    directories = []
+    for entry in root.iterdir():
+        if entry.is_dir():
+            directories.append(entry)
+        else:
+            entry.unlink(missing_ok=True)
+
+    directories.sort(key=lambda entry: entry.stat().st_mtime_ns)
+    for directory in directories[: max(len(directories) - keep, 0)]:
+        shutil.rmtree(directory, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description="Build a warm-start snapshot of the processed data."
+    )
+    parser.add_argument(
+        "path",
+        nargs="?",
+        default="data/processed/combined_data.csv",
+        help="The file path to the CSV data.",
+    )
+    args = parser.parse_args()
+
+    build_snapshot(args.path)
+    prune_snapshots(args.path)
+    print(f"Snapshot saved to {snapshot_dir(args.path)}")
@@ -0,0 +1,168 @@
+import numpy as np
+
+# SNOMED CT identifiers are between 6 and 18 digits long, so they always fit
+# in an int64
+MIN_CONCEPT_ID = 10**5
+MAX_CONCEPT_ID = 10**18
+
+# The partition identifier is the two digits before the check digit. Concepts
+# use 00, or 10 for concepts in an extension namespace.
+CONCEPT_PARTITIONS = (0, 10)
+
+# Verhoeff dihedral group multiplication table
+VERHOEFF_D = np.array(
+    [
+        [0, 1, 2, 3, 4, 5, 6, 7, 8, 9],
+        [1, 2, 3, 4, 0, 6, 7, 8, 9, 5],
+        [2, 3, 4, 0, 1, 7, 8, 9, 5, 6],
+        [3, 4, 0, 1, 2, 8, 9, 5, 6, 7],
+        [4, 0, 1, 2, 3, 9, 5, 6, 7, 8],
+        [5, 9, 8, 7, 6, 0, 4, 3, 2, 1],
+        [6, 5, 9, 8, 7, 1, 0, 4, 3, 2],
+        [7, 6, 5, 9, 8, 2, 1, 0, 4, 3],
+        [8, 7, 6, 5, 9, 3, 2, 1, 0, 4],
+        [9, 8, 7, 6, 5, 4, 3, 2, 1, 0],
+    ],
+    dtype=np.int8,
+)
+
+# Verhoeff permutation table, by digit position from the right modulo 8
+VERHOEFF_P = np.array(
+    [
+        [0, 1, 2, 3, 4, 5, 6, 7, 8, 9],
+        [1, 5, 7, 6, 2, 8, 3, 0, 9, 4],
+        [5, 8, 0, 3, 7, 9, 6, 1, 4, 2],
+        [8, 9, 1, 6, 0, 4, 3, 5, 2, 7],
+        [9, 4, 5, 3, 1, 2, 6, 8, 7, 0],
+        [4, 2, 8, 6, 5, 7, 3, 9, 0, 1],
+        [2, 7, 9, 3, 8, 0, 6, 4, 1, 5],
+        [7, 0, 4, 6, 9, 1, 3, 2, 5, 8],
+    ],
+    dtype=np.int8,
+)
+
+
+def _build_pair_table():
+    """
+    Combine the Verhoeff tables to process two digits of an ID in one step.
+
+    Returns:
+        ndarray: For each step modulo 4, the new check value indexed by
+        check * 200 + pair + 100 * last, where pair is the next two digits and
+        last is 1 if they are the leading digits of the ID, whose leading
+        zeros are skipped.
+    """
+    checks = np.arange(10)[:, None]
+    pairs = np.arange(100)[None, :]
+    low, high = pairs % 10, pairs // 10
+
+    table = np.empty((4, 10, 200), dtype=np.intp)
+    for step in range(4):
+        after_low = VERHOEFF_D[checks, VERHOEFF_P[2 * step, low]]
+        after_high = VERHOEFF_D[after_low, VERHOEFF_P[2 * step + 1, high]]
+        table[step, :, :100] = after_high
+        table[step, :, 100:] = np.where(
+            high > 0, after_high, np.where(low > 0, after_low, checks)
+        )
+    return table.reshape(4, -1)
+
+
+VERHOEFF_PAIR_TABLE = _build_pair_table()
+
+CODE_STATUSES = ("invalid", "unused", "matched")
+
+
+def verhoeff_valid(ids):
+    """
+    Check the Verhoeff check digit of each ID.
+
+    The IDs are processed two digits at a time for all IDs at once, so the
+    cost grows with the number of digits rather than the number of IDs.
+
+    Args:
+        ids (array-like): Non-negative integer IDs.
+
+    Returns:
+        ndarray: True where the last digit is a valid check digit.
+    """
+    remaining = np.array(ids, dtype=np.int64)
+    check = np.zeros(remaining.shape, dtype=np.intp)
+
+    step = 0
+    while remaining.any():
+        remaining, pair = np.divmod(remaining, 100)
+        last = remaining == 0
+        check = VERHOEFF_PAIR_TABLE[step % 4].take(check * 200 + pair + 100 * last)
+        step += 1
+
+    return check == 0
+
+
+def check_concept_ids(ids):
+    """
+    Check that each ID is a well formed SNOMED CT concept ID.
+
+    Args:
+        ids (array-like): Integer concept IDs.
+
+    Returns:
+        dict: Boolean arrays which are True where the ID has a valid length
+        ('length'), a concept partition identifier ('partition') and a valid
+        check digit ('check_digit'), and where all of these hold ('valid').
+    """
+    ids = np.asarray(ids, dtype=np.int64)
+
+    length = (ids >= MIN_CONCEPT_ID) & (ids < MAX_CONCEPT_ID)
+    partition = np.isin(ids // 10 % 100, CONCEPT_PARTITIONS)
+    check_digit = verhoeff_valid(np.where(length, ids, 0)) & length
+
+    return {
+        "length": length,
+        "partition": partition,
+        "check_digit": check_digit,
+        "valid": length & partition & check_digit,
+    }
+
+
+def describe_invalid_ids(checks):
+    """
+    Describe why each ID failed the checks in check_concept_ids.
+
+    Args:
+        checks (dict): The arrays returned by check_concept_ids.
+
+    Returns:
+        ndarray: The reason each ID is invalid, or an empty string if it is
+        valid.
+    """
+    return np.select(
+        [~checks["length"], ~checks["partition"], ~checks["check_digit"]],
+        [
+            "Not 6 to 18 digits long",
+            "Not a concept ID (partition identifier)",
+            "Check digit is wrong (possible typo)",
+        ],
+        default="",
+    )
+
+
+def classify_codes(codes, sorted_ids):
+    """
+    Classify codes as invalid, valid but unused in the dataset, or matched.
+
+    Args:
+        codes (array-like): Integer concept IDs, e.g. from a code list.
+        sorted_ids (ndarray): The sorted concept IDs in the dataset, e.g. from
+        the index returned by build_code_index.
+
+    Returns:
+        ndarray: One of CODE_STATUSES for each code.
+    """
+    codes = np.asarray(codes, dtype=np.int64)
+    valid = check_concept_ids(codes)["valid"]
+
+    positions = np.searchsorted(sorted_ids, codes)
+    found = positions < len(sorted_ids)
+    found[found] = sorted_ids[positions[found]] == codes[found]
+
+    return np.select([~valid, ~found], ["invalid", "unused"], default="matched")